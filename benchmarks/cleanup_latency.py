@@ -0,0 +1,53 @@
+"""Show handler latency staying flat as the number of stale messages grows.
+
+Drives cleanup_messages against a fake Bot whose deletes take a fixed delay:
+
+    python -m benchmarks.cleanup_latency
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from bot.handlers.message_handlers import cleanup_messages
+from bot.utils.cleanup import message_cleaner
+from bot.utils.session_store import MessageRef, UserSession
+
+DELETE_LATENCY = 0.05  # Simulated Bot API round trip in seconds
+CHAT_ID = 1
+
+
+class FakeBot:
+    def __init__(self):
+        self.deleted = 0
+
+    async def delete_message(self, chat_id, message_id):
+        await asyncio.sleep(DELETE_LATENCY)
+        self.deleted += 1
+
+
+def stale_context(bot, count):
+    session = UserSession()
+    session.last_bot_messages = tuple(MessageRef(CHAT_ID, i) for i in range(count))
+    session.last_audio_message = MessageRef(CHAT_ID, count)
+    session.last_user_message = MessageRef(CHAT_ID, count + 1)
+    return SimpleNamespace(bot=bot, user_data=session)
+
+
+async def main():
+    for count in (1, 10, 50, 200):
+        bot = FakeBot()
+        context = stale_context(bot, count)
+        
+        start = time.perf_counter()
+        await cleanup_messages(context)
+        handler = (time.perf_counter() - start) * 1000
+        await message_cleaner.drain()
+        total = (time.perf_counter() - start) * 1000
+        
+        serial = (count + 2) * DELETE_LATENCY * 1000
+        print(f"stale={count + 2:4d}  handler={handler:6.2f}ms  background={total:8.1f}ms  "
+              f"serial would be {serial:8.1f}ms  deleted={bot.deleted}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""Measure event-loop lag while DatabaseManager calls run concurrently.
+
+Run against a scratch database (point DB_URL in config at a throwaway file):
+
+    python -m benchmarks.db_event_loop_lag
+"""
+import asyncio
+import statistics
+import time
+
+from bot.database.models import init_db
+from bot.database.operations import DatabaseManager
+
+TICK = 0.005  # Interval of the lag probe in seconds
+USER_ID_BASE = 9_000_000_000  # Keep benchmark rows away from real users
+
+
+async def probe_lag(samples, stop):
+    """Record how late the loop wakes up a sleeping task."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append((time.perf_counter() - start - TICK) * 1000)
+
+
+async def db_worker(db, user_id, iterations):
+    """Write and read back songs for one synthetic user."""
+    await db.create_user(user_id, f"bench_{user_id}")
+    for i in range(iterations):
+        song = await db.add_song(
+            title=f"Song {i}",
+            artist="Bench",
+            duration=180,
+            file_id=f"bench_{user_id}_{i}",
+            user_id=user_id
+        )
+        await db.add_song_to_playlist(user_id, song.song_id)
+        await db.get_playlist_songs(user_id)
+
+
+async def run(concurrency, iterations=20):
+    db = DatabaseManager()
+    samples, stop = [], asyncio.Event()
+    probe = asyncio.create_task(probe_lag(samples, stop))
+    await asyncio.gather(*(
+        db_worker(db, USER_ID_BASE + concurrency * 1000 + n, iterations)
+        for n in range(concurrency)
+    ))
+    stop.set()
+    await probe
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+    print(f"concurrency={concurrency:3d}  lag p50={statistics.median(samples):6.2f}ms  "
+          f"p99={p99:6.2f}ms  max={samples[-1]:6.2f}ms")
+
+
+async def main():
+    init_db()
+    for concurrency in (1, 8, 32, 64):
+        await run(concurrency)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
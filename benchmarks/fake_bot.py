@@ -0,0 +1,61 @@
+"""In-memory stand-in for the Bot API, plugged in as the application's request backend.
+
+Unlike stub_bot_api nothing goes over a socket, so a load test measures the
+handlers and the database rather than HTTP round trips.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+from benchmarks.stub_bot_api import BOT_INFO
+
+
+class FakeBotRequest(BaseRequest):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(api_method, params)}).encode()
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_INFO
+        if method == 'getUpdates':
+            return []
+        if method.startswith('send') or method.startswith('edit'):
+            chat_id = int(params.get('chat_id', 0) or 0)
+            message = {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': str(params.get('text', '')),
+            }
+            if method == 'sendAudio':
+                file_id = params.get('audio')
+                if not isinstance(file_id, str):
+                    file_id = f"fake_audio_{next(self._file_ids)}"
+                message['audio'] = {'file_id': file_id, 'file_unique_id': file_id, 'duration': 180}
+            return message
+        return True
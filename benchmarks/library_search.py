@@ -0,0 +1,110 @@
+"""Time full-text library search against a large library.
+
+Fills one user's library (plus a catalog shared with other users) and times
+DatabaseManager.search_library for a mix of common, rare, prefix and missing
+words, both as the bare query and awaited through the DB executor. Run against
+a scratch database (point DB_URL in config at a throwaway file):
+
+    python -m benchmarks.library_search [songs_per_user]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+from bot.database.engine import get_engine
+from bot.database.library_index import index_songs
+from bot.database.models import init_db
+from bot.database.operations import DatabaseManager
+
+SONGS_PER_USER = 100_000
+CATALOG_SIZE = 250_000  # Tracks owned by anyone
+OTHER_USERS = 50
+OTHER_SONGS = 2_000
+USER_ID_BASE = 9_400_000_000  # Keep benchmark rows away from real users
+LOOKUPS = 2_000
+# A few words show up in a large share of titles; the rest follow a long tail
+COMMON_WORDS = (
+    "love night heart dance fire blue summer rain dream light girl city road "
+    "river gold wild home moon baby time shadow star ocean sweet storm"
+).split()
+_syllables = random.Random(7)
+RARE_WORDS = [
+    ''.join(_syllables.choice('bcdfghklmnprstvz') + _syllables.choice('aeiou') for _ in range(3))
+    for _ in range(20_000)
+]
+QUERIES = [
+    "love", "night dance", RARE_WORDS[16], f"{RARE_WORDS[2]} love", RARE_WORDS[5][:4], "sweet stor", "zzzz"
+]
+
+
+def title(rng):
+    words = []
+    for _ in range(rng.randint(1, 4)):
+        if rng.random() < 0.3:
+            words.append(rng.choice(COMMON_WORDS))
+        else:
+            words.append(RARE_WORDS[min(int(rng.paretovariate(1.2)) - 1, len(RARE_WORDS) - 1)])
+    return ' '.join(words).title()
+
+
+def populate(songs_per_user):
+    rng = random.Random(42)
+    with get_engine().begin() as conn:
+        conn.execute(text(
+            "DELETE FROM library_fts WHERE rowid IN (SELECT song_id FROM songs WHERE user_id >= :base)"
+        ), {'base': USER_ID_BASE})
+        conn.execute(text("DELETE FROM songs WHERE user_id >= :base"), {'base': USER_ID_BASE})
+        conn.execute(text("DELETE FROM users WHERE user_id >= :base"), {'base': USER_ID_BASE})
+        conn.execute(text("DELETE FROM tracks WHERE source_id LIKE 'bench_%'"))
+        conn.execute(
+            text("INSERT INTO users (user_id, username) VALUES (:u, 'bench')"),
+            [{'u': USER_ID_BASE + i} for i in range(OTHER_USERS + 1)]
+        )
+        conn.execute(
+            text("INSERT INTO tracks (source_id, title, artist, duration, file_id) "
+                 "VALUES (:source, :title, :artist, 200, :file_id)"),
+            [{
+                'source': f"bench_{i}", 'title': title(rng), 'artist': f"Artist {i % 5000}",
+                'file_id': f"bench_file_{i}"
+            } for i in range(CATALOG_SIZE)]
+        )
+        first = conn.execute(text("SELECT MIN(track_id) FROM tracks WHERE source_id LIKE 'bench_%'")).scalar()
+        tracks = range(first, first + CATALOG_SIZE)
+        rows = [{'u': USER_ID_BASE, 't': t} for t in rng.sample(tracks, songs_per_user)]
+        for other in range(1, OTHER_USERS + 1):
+            rows += [{'u': USER_ID_BASE + other, 't': t} for t in rng.sample(tracks, OTHER_SONGS)]
+        conn.execute(text("INSERT INTO songs (user_id, track_id, download_count) VALUES (:u, :t, 1)"), rows)
+        songs = conn.execute(text(
+            "SELECT s.song_id, s.user_id, t.title, t.artist FROM songs s "
+            "JOIN tracks t ON t.track_id = s.track_id WHERE s.user_id >= :base"
+        ), {'base': USER_ID_BASE}).all()
+        index_songs(conn, songs)
+        conn.execute(text("INSERT INTO library_fts (library_fts) VALUES ('optimize')"))
+    return USER_ID_BASE
+
+
+async def main():
+    songs_per_user = int(sys.argv[1]) if len(sys.argv) > 1 else SONGS_PER_USER
+    init_db()
+    user_id = populate(songs_per_user)
+    db = DatabaseManager()
+    search = DatabaseManager.search_library.__wrapped__
+    print(f"{songs_per_user} songs in the library, {CATALOG_SIZE} tracks in the catalog")
+    for query in QUERIES:
+        hits = search(db, user_id, query)
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            search(db, user_id, query)
+        direct = (time.perf_counter() - start) / LOOKUPS * 1e6
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            await db.search_library(user_id, query)
+        awaited = (time.perf_counter() - start) / LOOKUPS * 1e6
+        print(f"{query!r:16} {len(hits)} hits  {direct:6.0f} us query  {awaited:6.0f} us awaited")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
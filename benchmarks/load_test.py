@@ -0,0 +1,192 @@
+"""Load-test the real handlers end to end with synthetic users.
+
+Builds the application with create_application(), swaps the Bot API for an
+in-memory fake and the MusicDownloader for canned results, then pushes a burst
+of commands, searches and playlist callbacks through the update queue. Run
+against a scratch database (point DB_URL in config at a throwaway file):
+
+    python -m benchmarks.load_test --users 200 --rounds 3
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from benchmarks.fake_bot import FakeBotRequest
+from bot import create_application, downloader
+from bot.handlers.message_handlers import db, search_cache
+from bot.search.sessions import search_sessions
+
+USER_ID_BASE = 9_400_000_000  # Keep benchmark rows away from real users
+PLAYLIST_SIZE = 30
+SEARCH_LATENCY = 0.05  # Simulated remote search in seconds
+
+
+async def fake_search(query):
+    await asyncio.sleep(SEARCH_LATENCY)
+    return [
+        {'id': f"{query}-{i}", 'title': f"{query} {i}", 'uploader': "Load Test", 'duration': 180 + i}
+        for i in range(5)
+    ]
+
+
+async def fake_download(track):
+    handle, path = tempfile.mkstemp(suffix='.mp3')
+    os.write(handle, b'\0' * 1024)
+    os.close(handle)
+    return path
+
+
+def sender(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+
+
+def chat(user_id):
+    return {'id': user_id, 'type': 'private'}
+
+
+def message_update(update_id, user_id, text):
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat(user_id), 'from': sender(user_id), 'text': text}
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': sender(user_id), 'chat_instance': str(user_id), 'data': data,
+            'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat(user_id), 'text': "⚡"}
+        }
+    }
+
+
+def scenario(user_id, playlist_id, song_ids, round_):
+    """One round of a user's session: (kind, builder) pairs in the order the user sends them."""
+    song_id = song_ids[round_ % len(song_ids)]
+    return [
+        ('/start', lambda uid: message_update(uid, user_id, '/start')),
+        ('/search', lambda uid: message_update(uid, user_id, '/search')),
+        ('search text', lambda uid: message_update(uid, user_id, f"artist {user_id % 97} song {round_}")),
+        ('playlist', lambda uid: callback_update(uid, user_id, 'playlist')),
+        ('p_play_', lambda uid: callback_update(uid, user_id, f"p_play_{song_id}")),
+        ('p_del_', lambda uid: callback_update(uid, user_id, f"p_del_{song_id}_{playlist_id}_1_0")),
+        ('/queue', lambda uid: message_update(uid, user_id, '/queue')),
+        ('/help', lambda uid: message_update(uid, user_id, '/help')),
+    ]
+
+
+async def populate(users):
+    playlists = {}
+    for user_id in users:
+        await db.create_user(user_id, f"load_{user_id}")
+        song_ids = []
+        for i in range(PLAYLIST_SIZE):
+            song = await db.add_song(
+                title=f"Load Song {i}",
+                artist="Load Test",
+                duration=180 + i,
+                file_id=f"load_{user_id}_{i}",
+                user_id=user_id
+            )
+            song_ids.append(song.song_id)
+        await db.add_songs_to_playlist(user_id, song_ids)
+        playlist = (await db.get_user_playlists(user_id))[0]
+        playlists[user_id] = (playlist.playlist_id, song_ids)
+    return playlists
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def main(user_count, rounds, latency):
+    request = FakeBotRequest(latency)
+    application = create_application('polling', request=request)
+    search_cache.search_func = fake_search
+    downloader.download_music = fake_download
+
+    started, finished, kinds, enqueued = {}, {}, {}, {}
+
+    async def mark_start(update, context):
+        started[update.update_id] = time.perf_counter()
+
+    async def mark_end(update, context):
+        if kinds[update.update_id] == 'search text':
+            # handle_message only schedules the search; wait for it as the user would,
+            # which also holds back this user's next update until the results are shown
+            search = search_sessions.current(update.effective_user.id)
+            if search is not None:
+                try:
+                    await search
+                except asyncio.CancelledError:
+                    pass
+        finished[update.update_id] = time.perf_counter()
+
+    application.add_handler(TypeHandler(Update, mark_start), group=-2)
+    application.add_handler(TypeHandler(Update, mark_end), group=100)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    users = [USER_ID_BASE + i for i in range(user_count)]
+    playlists = await populate(users)
+
+    updates = []
+    update_id = 1
+    for round_ in range(rounds):
+        steps = {user_id: scenario(user_id, *playlists[user_id], round_) for user_id in users}
+        for step in range(len(next(iter(steps.values())))):
+            for user_id in users:
+                kind, build = steps[user_id][step]
+                kinds[update_id] = kind
+                updates.append(Update.de_json(build(update_id), application.bot))
+                update_id += 1
+
+    start = time.perf_counter()
+    for update in updates:
+        enqueued[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+    await application.update_queue.join()
+    elapsed = time.perf_counter() - start
+
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+    by_kind = defaultdict(list)
+    waits = []
+    for uid, end in finished.items():
+        by_kind[kinds[uid]].append(end - started[uid])
+        waits.append(end - enqueued[uid])
+
+    print(f"{len(finished)} updates from {user_count} users in {elapsed:.2f}s: {len(finished) / elapsed:.0f} updates/s")
+    print(f"{'kind':12s} {'count':>6s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    for kind, values in sorted(by_kind.items()):
+        values.sort()
+        print(f"{kind:12s} {len(values):6d} {percentile(values, 0.5):8.2f} "
+              f"{percentile(values, 0.95):8.2f} {percentile(values, 0.99):8.2f}")
+    waits.sort()
+    print(f"{'queue+handler':12s} {len(waits):6d} {percentile(waits, 0.5):8.2f} "
+          f"{percentile(waits, 0.95):8.2f} {percentile(waits, 0.99):8.2f}")
+    print(f"Bot API calls: {dict(request.calls.most_common())}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help="Fake Bot API latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.rounds, args.latency))
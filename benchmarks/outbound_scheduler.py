@@ -0,0 +1,59 @@
+"""Drive mixed-priority Bot API traffic through ScheduledRequest against a local stub.
+
+Reports how long each priority class waited and how many 429s were absorbed:
+
+    python -m benchmarks.outbound_scheduler
+"""
+import asyncio
+import statistics
+import time
+
+from telegram import Bot
+
+from bot.network.outbound import BACKGROUND, OutboundScheduler, ScheduledRequest, priority
+from benchmarks.stub_bot_api import StubBotAPI
+
+CHATS = 20
+ROUNDS = 5
+
+
+async def timed(samples, label, call):
+    start = time.perf_counter()
+    await call
+    samples.setdefault(label, []).append((time.perf_counter() - start) * 1000)
+
+
+async def main():
+    stub = StubBotAPI(flood_rate=0.02, retry_after=1)
+    await stub.start()
+    request = ScheduledRequest(OutboundScheduler(global_rate=30, chat_rate=1, chat_burst=3))
+    bot = Bot("123:stub", base_url=f"{stub.base_url}/bot", request=request)
+    samples = {}
+    
+    async with bot:
+        calls = []
+        for round_number in range(ROUNDS):
+            for chat_id in range(1, CHATS + 1):
+                calls.append(timed(samples, 'cleanup delete', bot.delete_message(chat_id, round_number)))
+                calls.append(timed(samples, 'interactive edit', bot.edit_message_text(
+                    "Searching...", chat_id=chat_id, message_id=round_number)))
+        
+        async def bulk(chat_id):
+            with priority(BACKGROUND):
+                await bot.send_message(chat_id, "Weekly digest")
+        calls.extend(timed(samples, 'bulk send', bulk(chat_id)) for chat_id in range(1, CHATS + 1))
+        
+        start = time.perf_counter()
+        await asyncio.gather(*calls)
+        elapsed = time.perf_counter() - start
+    await stub.stop()
+    
+    print(f"{len(stub.calls)} calls in {elapsed:.2f}s ({len(stub.calls) / elapsed:.1f}/s), "
+          f"{sum(stub.floods.values())} retry_after responses absorbed")
+    for label, values in samples.items():
+        values.sort()
+        print(f"{label:17s} p50={statistics.median(values):8.1f}ms  p95={values[int(len(values) * 0.95) - 1]:8.1f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""Time restart and flush costs of DatabasePersistence against PicklePersistence.
+
+Stores sessions for many users, then measures startup load, a first-update
+load and a flush after a small fraction of users changed. Run against a
+scratch database (point DB_URL in config at a throwaway file):
+
+    python -m benchmarks.persistence_restart
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+from telegram.ext import ContextTypes, PersistenceInput, PicklePersistence
+
+from bot.database.models import UserState, init_db
+from bot.database.engine import get_engine
+from bot.database.persistence import DatabasePersistence
+from bot.utils.session_store import MessageRef, SearchResult, UserSession
+
+USERS = 100_000
+ACTIVE = 500  # Users whose session changes between flushes
+USER_ID_BASE = 9_300_000_000  # Keep benchmark rows away from real users
+
+
+def session(user_id):
+    data = UserSession()
+    data.last_bot_message = MessageRef(user_id, 1)
+    data.last_bot_messages = (MessageRef(user_id, 1),)
+    data.search_query = "shape of you"
+    data.search_results = tuple(
+        SearchResult(f"vid{i}", f"Song {i}", f"Artist {i}", 180 + i, f"https://example.com/watch?v=vid{i}")
+        for i in range(5)
+    )
+    return data
+
+
+def populate():
+    table = UserState.__table__
+    with get_engine().begin() as conn:
+        conn.execute(table.delete().where(table.c.user_id >= USER_ID_BASE))
+        conn.execute(table.insert(), [
+            {'user_id': USER_ID_BASE + i, 'state': DatabasePersistence.encode(session(USER_ID_BASE + i))}
+            for i in range(USERS)
+        ])
+
+
+def timed(start):
+    return (time.perf_counter() - start) * 1000
+
+
+async def bench_database():
+    persistence = DatabasePersistence(flush_delay=3600)
+    start = time.perf_counter()
+    await persistence.get_user_data()
+    startup = timed(start)
+
+    sessions = {}
+    start = time.perf_counter()
+    for i in range(ACTIVE):
+        user_id = USER_ID_BASE + i
+        sessions[user_id] = UserSession()
+        await persistence.refresh_user_data(user_id, sessions[user_id])
+    first_update = timed(start) / ACTIVE
+
+    for user_id, data in sessions.items():
+        data.search_query = "blinding lights"
+        await persistence.update_user_data(user_id, data)
+    start = time.perf_counter()
+    await persistence.flush()
+    flush = timed(start)
+    return startup, first_update, flush
+
+
+async def bench_pickle(path):
+    store = PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False)
+    context_types = ContextTypes(user_data=UserSession)
+    writer = PicklePersistence(path, store_data=store, single_file=False, on_flush=True, context_types=context_types)
+    for i in range(USERS):
+        await writer.update_user_data(USER_ID_BASE + i, session(USER_ID_BASE + i))
+    await writer.flush()
+
+    persistence = PicklePersistence(path, store_data=store, single_file=False, on_flush=True, context_types=context_types)
+    start = time.perf_counter()
+    user_data = await persistence.get_user_data()
+    startup = timed(start)
+
+    for i in range(ACTIVE):
+        data = user_data[USER_ID_BASE + i]
+        data.search_query = "blinding lights"
+        await persistence.update_user_data(USER_ID_BASE + i, data)
+    start = time.perf_counter()
+    await persistence.flush()
+    flush = timed(start)
+    return startup, flush
+
+
+async def main():
+    init_db()
+    populate()
+    startup, first_update, flush = await bench_database()
+    print(f"DatabasePersistence  startup={startup:8.2f}ms  first update={first_update:6.3f}ms/user  "
+          f"flush {ACTIVE} dirty={flush:8.2f}ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        startup, flush = await bench_pickle(os.path.join(directory, 'state'))
+    print(f"PicklePersistence    startup={startup:8.2f}ms  first update=   (all loaded)  "
+          f"flush {ACTIVE} dirty={flush:8.2f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""Compare loading ORM entities with SongView projections on a 500-song playlist.
+
+    python -m benchmarks.playlist_read_models
+"""
+import time
+import tracemalloc
+
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from bot.database.engine import create_db_engine
+from bot.database.models import Base, Playlist, Song, SongView, SONG_VIEW_COLUMNS, Track, playlist_songs
+
+PLAYLIST_SIZE = 500
+ROUNDS = 50
+
+
+def populate(Session):
+    with Session() as session:
+        playlist = Playlist(user_id=1, name="My Music")
+        playlist.songs = [
+            Song(user_id=1, download_count=1, track=Track(
+                title=f"Song {i}", artist="Artist", duration=200 + i, file_id=f"file_{i}"
+            ))
+            for i in range(PLAYLIST_SIZE)
+        ]
+        session.add(playlist)
+        session.commit()
+
+
+def load_orm_copies(Session):
+    """The pre-SongView read path: load full ORM entities, then copy them out."""
+    with Session() as session:
+        playlist = session.query(Playlist).options(
+            joinedload(Playlist.songs).joinedload(Song.track)
+        ).filter(Playlist.user_id == 1).first()
+        return [
+            SongView(s.song_id, s.track.title, s.track.artist, s.track.duration,
+                     s.track.file_id, s.user_id, s.download_count)
+            for s in playlist.songs
+        ]
+
+
+def load_views(Session):
+    with Session() as session:
+        rows = session.query(*SONG_VIEW_COLUMNS).select_from(Song).join(
+            Track, Track.track_id == Song.track_id
+        ).join(
+            playlist_songs, playlist_songs.c.song_id == Song.song_id
+        ).filter(playlist_songs.c.playlist_id == 1)
+        return [SongView._make(row) for row in rows]
+
+
+def render(songs):
+    text = "⚡ *My Music*\n\n"
+    for i, song in enumerate(songs, 1):
+        duration = f"{song.duration // 60}:{song.duration % 60:02d}"
+        text += f"{i}. {song.title} - {song.artist} ({duration})\n"
+    return text
+
+
+def measure(label, load, Session):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        render(load(Session))
+    elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+    
+    tracemalloc.start()
+    songs = load(Session)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:10s} load+render={elapsed:7.2f}ms  retained={current / len(songs):7.0f}B/row  "
+          f"peak={peak / 1024:8.1f}KiB")
+
+
+def main():
+    engine = create_db_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    populate(Session)
+    
+    print(f"{PLAYLIST_SIZE}-song playlist, mean of {ROUNDS} rounds")
+    measure("ORM load", load_orm_copies, Session)
+    measure("SongView", load_views, Session)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Time playlist page views on a render-cache miss and on a hit.
+
+Run against a scratch database (point DB_URL in config at a throwaway file):
+
+    python -m benchmarks.playlist_render_cache
+"""
+import asyncio
+import time
+
+from bot.database.models import init_db
+from bot.handlers.playlist_view import db, render_cache, render_playlist
+
+USER_ID = 9_100_000_000  # Keep benchmark rows away from real users
+PLAYLIST_SIZE = 200
+ROUNDS = 200
+
+
+async def populate():
+    await db.create_user(USER_ID, "bench_render")
+    song_ids = []
+    for i in range(PLAYLIST_SIZE):
+        song = await db.add_song(
+            title=f"Song {i}",
+            artist="Bench",
+            duration=180 + i,
+            file_id=f"bench_render_{i}",
+            user_id=USER_ID
+        )
+        song_ids.append(song.song_id)
+    await db.add_songs_to_playlist(USER_ID, song_ids)
+
+
+async def time_views(clear_each_round):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        if clear_each_round:
+            render_cache.clear()
+        await render_playlist(USER_ID)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+async def main():
+    init_db()
+    await populate()
+    miss = await time_views(clear_each_round=True)
+    await render_playlist(USER_ID)
+    hit = await time_views(clear_each_round=False)
+    print(f"first page of a {PLAYLIST_SIZE}-song playlist, mean of {ROUNDS} views")
+    print(f"cache miss: {miss:8.3f}ms")
+    print(f"cache hit:  {hit:8.3f}ms  ({miss / max(hit, 1e-9):.0f}x faster)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
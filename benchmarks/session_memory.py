@@ -0,0 +1,103 @@
+"""Compare memory per user for dict user_data holding Message objects and UserSession.
+
+Builds sessions for many synthetic users, measures them with tracemalloc and
+then sweeps them through SessionStore against a tight budget:
+
+    python -m benchmarks.session_memory
+"""
+import datetime
+import time
+import tracemalloc
+
+from telegram import Chat, Message, User
+
+from bot.utils.session_store import MessageRef, SearchResult, SessionStore, UserSession
+
+USERS = 20_000
+BUDGET = 2 * 1024 * 1024
+
+
+class FakeApplication:
+    """Just the user_data surface of telegram.ext.Application."""
+
+    def __init__(self):
+        self.user_data = {}
+        self.persistence = None
+
+    def drop_user_data(self, user_id):
+        self.user_data.pop(user_id, None)
+
+
+def search_results(user_id):
+    return [
+        {
+            'id': f"vid{user_id}_{i}",
+            'title': f"Song {i} for user {user_id}",
+            'uploader': f"Artist {i}",
+            'duration': 180 + i,
+            'url': f"https://example.com/watch?v=vid{user_id}_{i}",
+            'webpage_url': f"https://example.com/watch?v=vid{user_id}_{i}",
+            'thumbnail': f"https://example.com/vi/vid{user_id}_{i}/hq.jpg",
+            'view_count': 1000 * i,
+            'channel_id': f"channel{i}",
+            'description': "A song. " * 20
+        }
+        for i in range(10)
+    ]
+
+
+def message(user_id, message_id, text):
+    user = User(user_id, f"user{user_id}", False)
+    chat = Chat(user_id, Chat.PRIVATE)
+    return Message(message_id, datetime.datetime.now(datetime.timezone.utc), chat, from_user=user, text=text)
+
+
+def legacy_session(user_id):
+    return {
+        'last_bot_message': message(user_id, 1, "⚡ *Search Results*"),
+        'last_bot_messages': [message(user_id, 2, "⚡ *Welcome to LightBolt!*")],
+        'last_audio_message': message(user_id, 3, ""),
+        'last_user_message': message(user_id, 4, "shape of you"),
+        'search_query': "shape of you",
+        'search_results': search_results(user_id)
+    }
+
+
+def compact_session(user_id):
+    session = UserSession()
+    session.last_bot_message = MessageRef(user_id, 1)
+    session.last_bot_messages = (MessageRef(user_id, 2),)
+    session.last_audio_message = MessageRef(user_id, 3)
+    session.last_user_message = MessageRef(user_id, 4)
+    session.search_query = "shape of you"
+    session.search_results = tuple(SearchResult.from_track(track) for track in search_results(user_id)[:5])
+    return session
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = {user_id: build(user_id) for user_id in range(USERS)}
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return sessions, used
+
+
+def main():
+    _, legacy = measure(legacy_session)
+    print(f"dict + Message     {legacy / USERS:8.0f} bytes/user")
+
+    sessions, compact = measure(compact_session)
+    print(f"UserSession        {compact / USERS:8.0f} bytes/user  ({legacy / compact:.1f}x smaller)")
+
+    application = FakeApplication()
+    application.user_data.update(sessions)
+    store = SessionStore(ttl=3600, memory_budget=BUDGET)
+    start = time.perf_counter()
+    store.sweep(application)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"sweep to {BUDGET // 1024} KiB budget in {elapsed:.1f}ms: {store.stats()}")
+
+
+if __name__ == '__main__':
+    main()
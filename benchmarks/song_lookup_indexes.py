@@ -0,0 +1,115 @@
+"""Compare lookup latency on 1M songs before and after the index migration.
+
+Builds the pre-migration schema in a temporary SQLite file, fills it, times the
+handler lookups, applies the migrations in place and times them again:
+
+    python -m benchmarks.song_lookup_indexes [song_count]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from bot.database.engine import create_db_engine
+from bot.database.migrations import run_migrations
+
+USERS = 10_000
+PLAYLIST_SIZE = 20
+LOOKUPS = 200
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (user_id INTEGER PRIMARY KEY, username VARCHAR(255), "
+    "join_date DATETIME, premium_status BOOLEAN)",
+    "CREATE TABLE playlists (playlist_id INTEGER PRIMARY KEY, user_id INTEGER, "
+    "name VARCHAR(255), created_at DATETIME)",
+    "CREATE TABLE songs (song_id INTEGER PRIMARY KEY, user_id INTEGER, title VARCHAR(255), "
+    "artist VARCHAR(255), duration INTEGER, file_id VARCHAR(512), download_count INTEGER, "
+    "added_at DATETIME)",
+    "CREATE TABLE playlist_songs (playlist_id INTEGER, song_id INTEGER, added_at DATETIME)",
+]
+
+QUERIES = {
+    'get_song_by_file_id': (
+        "SELECT song_id FROM songs WHERE file_id = :file_id",
+        lambda n: {'file_id': f"file_{random.randrange(n)}"}
+    ),
+    'get_user_songs': (
+        "SELECT song_id FROM songs WHERE user_id = :user_id",
+        lambda n: {'user_id': random.randrange(USERS)}
+    ),
+    'get_playlist_songs': (
+        "SELECT s.song_id FROM playlists p "
+        "JOIN playlist_songs ps ON ps.playlist_id = p.playlist_id "
+        "JOIN songs s ON s.song_id = ps.song_id WHERE p.user_id = :user_id",
+        lambda n: {'user_id': random.randrange(USERS)}
+    ),
+    'membership check': (
+        "SELECT 1 FROM playlist_songs WHERE playlist_id = :playlist_id AND song_id = :song_id",
+        lambda n: {'playlist_id': random.randrange(1, USERS + 1), 'song_id': random.randrange(n)}
+    ),
+}
+
+
+def populate(conn, song_count):
+    for statement in LEGACY_SCHEMA:
+        conn.execute(text(statement))
+    conn.execute(
+        text("INSERT INTO users (user_id, username) VALUES (:u, :name)"),
+        [{'u': u, 'name': f"user_{u}"} for u in range(USERS)]
+    )
+    conn.execute(
+        text("INSERT INTO playlists (playlist_id, user_id, name) VALUES (:p, :u, 'My Music')"),
+        [{'p': u + 1, 'u': u} for u in range(USERS)]
+    )
+    conn.execute(
+        text("INSERT INTO songs (song_id, user_id, title, artist, duration, file_id, download_count) "
+             "VALUES (:s, :u, :title, 'Artist', 200, :file_id, 1)"),
+        [{'s': s, 'u': s % USERS, 'title': f"Song {s}", 'file_id': f"file_{s}"} for s in range(song_count)]
+    )
+    conn.execute(
+        text("INSERT INTO playlist_songs (playlist_id, song_id) VALUES (:p, :s)"),
+        [{'p': s % USERS + 1, 's': s} for s in range(min(song_count, USERS * PLAYLIST_SIZE))]
+    )
+
+
+def measure(engine, song_count):
+    results = {}
+    with engine.connect() as conn:
+        for label, (sql, params) in QUERIES.items():
+            statement = text(sql)
+            start = time.perf_counter()
+            for _ in range(LOOKUPS):
+                conn.execute(statement, params(song_count)).fetchall()
+            results[label] = (time.perf_counter() - start) / LOOKUPS * 1000
+    return results
+
+
+def main():
+    song_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = create_db_engine(f"sqlite:///{path}")
+        with engine.begin() as conn:
+            populate(conn, song_count)
+        before = measure(engine, song_count)
+        # Only the index migrations; later ones reshape the songs table
+        run_migrations(engine, target=3)
+        after = measure(engine, song_count)
+        
+        print(f"{song_count:,} songs, mean of {LOOKUPS} lookups")
+        for label in QUERIES:
+            print(f"{label:22s} before={before[label]:9.3f}ms  after={after[label]:7.3f}ms  "
+                  f"speedup={before[label] / max(after[label], 1e-9):8.1f}x")
+        engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
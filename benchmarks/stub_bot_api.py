@@ -0,0 +1,84 @@
+"""Local stand-in for the Telegram Bot API, served over real HTTP.
+
+Answers every method with a plausible result, records each call and can be told
+to answer a fraction of calls with 429 retry_after to exercise flood handling.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from bot.network.http import HTTPRequest, HTTPResponse, HTTPServer
+
+BOT_INFO = {
+    'id': 1, 'is_bot': True, 'first_name': 'LightBolt', 'username': 'lightbolt_bot',
+    'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False,
+}
+
+
+class StubBotAPI:
+    def __init__(self, latency=0.0, flood_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls = []  # (monotonic time, method, params)
+        self.floods = Counter()
+        self._message_ids = itertools.count(1000)
+        self.server = HTTPServer(self._handle)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.server.port}"
+
+    async def start(self):
+        await self.server.start()
+
+    async def stop(self):
+        await self.server.stop()
+
+    async def _handle(self, request: HTTPRequest) -> HTTPResponse:
+        method = request.path.rsplit('/', 1)[-1]
+        params = _parse_params(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        
+        if method not in ('getMe', 'getUpdates') and random.random() < self.flood_rate:
+            self.floods[method] += 1
+            return _reply({
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.retry_after}",
+                'parameters': {'retry_after': self.retry_after},
+            }, status=429)
+        
+        self.calls.append((time.monotonic(), method, params))
+        return _reply({'ok': True, 'result': self._result(method, params)})
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return BOT_INFO
+        if method == 'getUpdates':
+            return []
+        if method.startswith('send') or method.startswith('edit'):
+            chat_id = int(params.get('chat_id', 0) or 0)
+            return {
+                'message_id': int(params.get('message_id') or next(self._message_ids)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        return True
+
+
+def _parse_params(request: HTTPRequest) -> dict:
+    if not request.body:
+        return {}
+    if request.headers.get('content-type', '').startswith('application/json'):
+        return json.loads(request.body)
+    return {key: values[0] for key, values in parse_qs(request.body.decode()).items()}
+
+
+def _reply(payload, status=200):
+    return HTTPResponse(status, json.dumps(payload).encode())
@@ -0,0 +1,147 @@
+"""Measure database size and library query time before and after the track catalog split.
+
+Builds a synthetic library in the pre-catalog schema (migration 3), times the
+library queries, applies the catalog migration in place and measures again:
+
+    python -m benchmarks.track_catalog [users] [songs_per_user]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from bot.database.engine import create_db_engine
+from bot.database.migrations import run_migrations
+from benchmarks.song_lookup_indexes import LEGACY_SCHEMA
+
+CATALOG_SIZE = 20_000
+DUPLICATE_RATE = 0.1  # Share of downloads that re-download a track the user already has
+LOOKUPS = 500
+
+BEFORE_QUERIES = {
+    'user library': (
+        "SELECT song_id, title, artist, duration, file_id FROM songs WHERE user_id = :user_id"
+    ),
+    'playlist page': (
+        "SELECT s.song_id, s.title, s.artist, s.duration, s.file_id FROM playlist_songs ps "
+        "JOIN songs s ON s.song_id = ps.song_id WHERE ps.playlist_id = :playlist_id "
+        "ORDER BY ps.added_at, ps.song_id LIMIT 10"
+    ),
+    'file_id by source': "SELECT file_id FROM songs WHERE source_id = :source_id LIMIT 1",
+}
+
+AFTER_QUERIES = {
+    'user library': (
+        "SELECT s.song_id, t.title, t.artist, t.duration, t.file_id FROM songs s "
+        "JOIN tracks t ON t.track_id = s.track_id WHERE s.user_id = :user_id"
+    ),
+    'playlist page': (
+        "SELECT s.song_id, t.title, t.artist, t.duration, t.file_id FROM playlist_songs ps "
+        "JOIN songs s ON s.song_id = ps.song_id JOIN tracks t ON t.track_id = s.track_id "
+        "WHERE ps.playlist_id = :playlist_id ORDER BY ps.added_at, ps.song_id LIMIT 10"
+    ),
+    'file_id by source': "SELECT file_id FROM tracks WHERE source_id = :source_id LIMIT 1",
+}
+
+
+def populate(conn, users, songs_per_user):
+    weights = [1 / (rank + 1) for rank in range(CATALOG_SIZE)]  # Zipf-like popularity
+    conn.execute(
+        text("INSERT INTO users (user_id, username) VALUES (:u, :name)"),
+        [{'u': u, 'name': f"user_{u}"} for u in range(users)]
+    )
+    conn.execute(
+        text("INSERT INTO playlists (playlist_id, user_id, name) VALUES (:p, :u, 'My Music')"),
+        [{'p': u + 1, 'u': u} for u in range(users)]
+    )
+    song_id = 0
+    for start in range(0, users, 1000):
+        songs, members = [], []
+        for u in range(start, min(start + 1000, users)):
+            picks = random.choices(range(CATALOG_SIZE), weights, k=songs_per_user)
+            picks += random.sample(picks, int(len(picks) * DUPLICATE_RATE))
+            for track in picks:
+                song_id += 1
+                songs.append({
+                    's': song_id, 'u': u, 'title': f"Track title number {track}",
+                    'artist': f"Artist name {track % 2000}", 'source': f"src_{track}",
+                    'file_id': f"CQACAgIAAxkBAAI{track:08d}{random.getrandbits(64):016x}",
+                })
+                members.append({'p': u + 1, 's': song_id})
+        conn.execute(
+            text("INSERT INTO songs (song_id, user_id, title, artist, duration, file_id, "
+                 "source_id, download_count, added_at) VALUES (:s, :u, :title, :artist, 210, "
+                 ":file_id, :source, 1, CURRENT_TIMESTAMP)"),
+            songs
+        )
+        conn.execute(
+            text("INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id, added_at) "
+                 "VALUES (:p, :s, CURRENT_TIMESTAMP)"),
+            members
+        )
+
+
+def measure(engine, path, queries, users):
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text("VACUUM"))
+    size = os.path.getsize(path) / 1024 / 1024
+    
+    timings = {}
+    with engine.connect() as conn:
+        for label, sql in queries.items():
+            statement = text(sql)
+            start = time.perf_counter()
+            for _ in range(LOOKUPS):
+                user_id = random.randrange(users)
+                conn.execute(statement, {
+                    'user_id': user_id,
+                    'playlist_id': user_id + 1,
+                    'source_id': f"src_{random.randrange(CATALOG_SIZE)}",
+                }).fetchall()
+            timings[label] = (time.perf_counter() - start) / LOOKUPS * 1000
+    return size, timings
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    songs_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = create_db_engine(f"sqlite:///{path}")
+        with engine.begin() as conn:
+            for statement in LEGACY_SCHEMA:
+                conn.execute(text(statement))
+        run_migrations(engine, target=3)
+        with engine.begin() as conn:
+            populate(conn, users, songs_per_user)
+            rows = conn.execute(text("SELECT COUNT(*) FROM songs")).scalar()
+        before_size, before = measure(engine, path, BEFORE_QUERIES, users)
+        
+        start = time.perf_counter()
+        run_migrations(engine)
+        migration_time = time.perf_counter() - start
+        with engine.connect() as conn:
+            entries = conn.execute(text("SELECT COUNT(*) FROM songs")).scalar()
+            tracks = conn.execute(text("SELECT COUNT(*) FROM tracks")).scalar()
+        after_size, after = measure(engine, path, AFTER_QUERIES, users)
+        
+        print(f"{users:,} users, {rows:,} song rows -> {tracks:,} tracks + {entries:,} library entries "
+              f"(migration took {migration_time:.1f}s)")
+        print(f"database size      before={before_size:8.1f}MiB  after={after_size:8.1f}MiB")
+        for label in BEFORE_QUERIES:
+            print(f"{label:18s} before={before[label]:8.3f}ms   after={after[label]:8.3f}ms")
+        engine.dispose()
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    main()
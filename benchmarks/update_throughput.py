@@ -0,0 +1,100 @@
+"""Compare update processors on synthetic updates: throughput, latency and per-user ordering.
+
+One user sends slow updates (a long search or download) while many others send
+quick ones. Each processor is driven through a real Application whose Bot talks
+to the local stub Bot API:
+
+    python -m benchmarks.update_throughput
+"""
+import asyncio
+import statistics
+import time
+
+from telegram import Update
+from telegram.ext import Application, SimpleUpdateProcessor, TypeHandler
+
+from benchmarks.stub_bot_api import StubBotAPI
+from bot.utils.update_processor import PerUserUpdateProcessor
+
+USERS = 200
+UPDATES_PER_USER = 10
+FAST_WORK = 0.01  # Seconds of handler await per update
+SLOW_WORK = 0.5
+SLOW_USER = 0
+
+
+def message_update(update_id, user_id):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': f"song {update_id}",
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+        }
+    }
+
+
+async def run(stub, processor):
+    enqueued = {}
+    latencies = []
+    running = set()
+    violations = 0
+
+    async def handler(update, context):
+        nonlocal violations
+        user_id = update.effective_user.id
+        if user_id in running:
+            violations += 1  # Started before the same user's previous update finished
+        running.add(user_id)
+        await asyncio.sleep(SLOW_WORK if user_id == SLOW_USER else FAST_WORK)
+        running.discard(user_id)
+        if user_id != SLOW_USER:
+            latencies.append(time.perf_counter() - enqueued[update.update_id])
+
+    application = (
+        Application.builder()
+        .token("1:bench")
+        .base_url(f"{stub.base_url}/bot")
+        .concurrent_updates(processor)
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, handler))
+    await application.initialize()
+    await application.start()
+
+    updates = [
+        Update.de_json(message_update(round_ * USERS + user_id, user_id), application.bot)
+        for round_ in range(UPDATES_PER_USER) for user_id in range(USERS)
+    ]
+    start = time.perf_counter()
+    for update in updates:
+        enqueued[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+    await application.update_queue.join()
+    elapsed = time.perf_counter() - start
+
+    await application.stop()
+    await application.shutdown()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    return len(updates) / elapsed, statistics.median(latencies) * 1000, p95, violations
+
+
+async def main():
+    stub = StubBotAPI()
+    await stub.start()
+    processors = [
+        ("sequential", SimpleUpdateProcessor(1)),
+        ("concurrent_updates=16", SimpleUpdateProcessor(16)),
+        ("PerUserUpdateProcessor(16)", PerUserUpdateProcessor(concurrency=16)),
+    ]
+    for name, processor in processors:
+        rate, p50, p95, violations = await run(stub, processor)
+        print(f"{name:28s} {rate:8.1f} updates/s  other users p50={p50:8.1f}ms p95={p95:8.1f}ms  "
+              f"overlapping per user={violations}")
+    await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
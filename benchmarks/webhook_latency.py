@@ -0,0 +1,165 @@
+"""Measure webhook update-to-handler latency, backpressure and shutdown drain, fully offline.
+
+POSTs recorded-style Update JSON to a WebhookReceiver on localhost over
+keep-alive connections; the Bot talks to the local stub Bot API:
+
+    python -m benchmarks.webhook_latency
+"""
+import asyncio
+import json
+import time
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.stub_bot_api import StubBotAPI
+from bot.network.webhook import SECRET_HEADER, IngestQueue, WebhookReceiver
+from bot.utils.update_processor import PerUserUpdateProcessor
+
+SECRET = "bench-secret"
+CONNECTIONS = 8
+UPDATES = 4000
+USERS = 400
+# Backpressure: more clients than queue slots, few enough users that their
+# in-order handling can't keep up, so the queue stays full past the ingest timeout
+BACKPRESSURE_CAPACITY = 50
+BACKPRESSURE_CONNECTIONS = 200
+BACKPRESSURE_USERS = 8
+
+
+def recorded_update(update_id, user_id):
+    sender = {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}", 'language_code': 'en'}
+    chat = {'id': user_id, 'type': 'private', 'first_name': f"user{user_id}"}
+    if update_id % 2:
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id), 'from': sender, 'chat_instance': str(user_id), 'data': 'playlist',
+                'message': {'message_id': 1, 'date': 1700000000, 'chat': chat, 'text': "⚡ *My Music*"}
+            }
+        }
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 1700000000, 'chat': chat, 'from': sender, 'text': "shape of you"}
+    }
+
+
+class Client:
+    """Keep-alive HTTP/1.1 client for POSTing JSON."""
+
+    def __init__(self, port):
+        self.port = port
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+
+    async def post(self, path, payload, secret=SECRET):
+        body = json.dumps(payload).encode()
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"{SECRET_HEADER}: {secret}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode().split('\r\n')
+        length = next(int(line.split(':')[1]) for line in lines if line.lower().startswith('content-length'))
+        await self.reader.readexactly(length)
+        return int(lines[0].split(' ')[1])
+
+    def close(self):
+        self.writer.close()
+
+
+async def build(stub, capacity, work):
+    handled = {}
+
+    async def handler(update, context):
+        handled[update.update_id] = time.perf_counter()
+        await asyncio.sleep(work)
+
+    application = (
+        Application.builder()
+        .token("1:bench")
+        .base_url(f"{stub.base_url}/bot")
+        .updater(None)
+        .update_queue(IngestQueue(capacity))
+        .concurrent_updates(PerUserUpdateProcessor())
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, handler))
+    await application.initialize()
+    await application.start()
+    receiver = WebhookReceiver(application, secret_token=SECRET, port=0, ingest_timeout=0.2)
+    await receiver.start()
+    return application, receiver, handled
+
+
+async def post_all(receiver, payloads, connections=CONNECTIONS):
+    sent = {}
+    statuses = []
+    chunks = [payloads[i::connections] for i in range(connections)]
+
+    async def worker(chunk):
+        client = Client(receiver.server.port)
+        await client.connect()
+        for payload in chunk:
+            sent[payload['update_id']] = time.perf_counter()
+            statuses.append(await client.post(receiver.path, payload))
+        client.close()
+
+    await asyncio.gather(*(worker(chunk) for chunk in chunks))
+    return sent, statuses
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def latency(stub):
+    application, receiver, handled = await build(stub, capacity=1024, work=0.001)
+    payloads = [recorded_update(i, i % USERS) for i in range(UPDATES)]
+    start = time.perf_counter()
+    sent, statuses = await post_all(receiver, payloads)
+    await receiver.stop()
+    elapsed = time.perf_counter() - start
+    await application.stop()
+    await application.shutdown()
+
+    delays = sorted(handled[update_id] - sent[update_id] for update_id in handled)
+    print(f"latency     {len(handled)} updates in {elapsed:.2f}s ({len(handled) / elapsed:.0f}/s)  "
+          f"p50={percentile(delays, 0.5):.2f}ms p95={percentile(delays, 0.95):.2f}ms "
+          f"p99={percentile(delays, 0.99):.2f}ms  non-200={sum(status != 200 for status in statuses)}")
+
+
+async def backpressure(stub):
+    application, receiver, handled = await build(stub, capacity=BACKPRESSURE_CAPACITY, work=0.2)
+    client = Client(receiver.server.port)
+    await client.connect()
+    forbidden = await client.post(receiver.path, recorded_update(0, 1), secret="wrong")
+    client.close()
+
+    payloads = [recorded_update(i, i % BACKPRESSURE_USERS) for i in range(1, 1001)]
+    _, statuses = await post_all(receiver, payloads, BACKPRESSURE_CONNECTIONS)
+    accepted = statuses.count(200)
+    busy = statuses.count(503)
+    start = time.perf_counter()
+    await receiver.stop()
+    drain = time.perf_counter() - start
+    await application.stop()
+    await application.shutdown()
+    print(f"backpressure bad secret -> {forbidden}  accepted={accepted} busy(503)={busy}  "
+          f"handled after drain={len(handled)}  drain={drain:.2f}s")
+    assert forbidden == 403, f"bad secret answered {forbidden}"
+    assert busy > 0, "the ingest queue never filled, so the 503 path went unexercised"
+    assert len(handled) == accepted, "accepted updates were lost in the drain"
+
+
+async def main():
+    stub = StubBotAPI()
+    await stub.start()
+    await latency(stub)
+    await backpressure(stub)
+    await stub.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,28 +1,105 @@
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+import os
+from typing import Optional
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    MessageHandler,
+    CallbackQueryHandler,
+    ContextTypes,
+    TypeHandler,
+    filters
+)
 
 from config import BOT_TOKEN
 from .handlers.command_handlers import (
     start_command,
     help_command,
     search_command,
-    playlist_command
+    playlist_command,
+    queue_command
 )
-from .handlers.message_handlers import handle_message, handle_callback
+from .handlers.message_handlers import handle_message, handle_callback, handle_download_completion, downloader
 from .database.models import init_db
+from .database.counters import download_counter
+from .database.operations import executor as db_executor
+from .database.persistence import DatabasePersistence
+from .utils.cleanup import message_cleaner
+from .utils.session_store import UserSession, session_store
+from .utils.update_processor import PerUserUpdateProcessor
+from .utils.metrics import METRICS_PORT, metrics_endpoint
+from .utils.tracing import tracer
+from .network.outbound import ScheduledRequest
+from .network.webhook import IngestQueue, run_webhook
+from .downloads.queue import download_queue
+
+# Point at a local Bot API server (or a stub) instead of api.telegram.org
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL')
+# 'polling' or 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+async def post_init(application: Application) -> None:
+    """Start background services once the application is initialized."""
+    download_counter.start(db_executor)
+    await download_queue.start(
+        application.bot,
+        download=downloader.download_music,
+        on_complete=handle_download_completion
+    )
+    session_store.start(application)
+    if METRICS_PORT:
+        await metrics_endpoint.start()
+
+async def post_stop(application: Application) -> None:
+    """Stop services that still call the Bot API, while its HTTP backend is up."""
+    await download_queue.stop()
+    await message_cleaner.drain()
 
-def create_application() -> Application:
-    """Create and configure the bot application."""
+async def post_shutdown(application: Application) -> None:
+    """Flush buffered state before the process exits."""
+    await metrics_endpoint.stop()
+    await session_store.stop()
+    await download_counter.stop(db_executor)
+    tracer.close()
+
+def create_application(mode: str = BOT_MODE, request: Optional[BaseRequest] = None) -> Application:
+    """Create and configure the bot application for polling or webhook mode."""
+    if mode not in ('polling', 'webhook'):
+        raise ValueError(f"Unknown bot mode: {mode}")
+    
     # Initialize database
     init_db()
     
-    # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Create application; outbound calls are paced by the scheduled request backend and
+    # updates run concurrently across users but in order for each user
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .request(request or ScheduledRequest())
+        .context_types(ContextTypes(user_data=UserSession))
+        .persistence(DatabasePersistence())
+        .concurrent_updates(PerUserUpdateProcessor())
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(f"{BOT_API_BASE_URL}/bot")
+    if mode == 'webhook':
+        # Updates arrive over HTTP; the ingest queue pushes back when handlers fall behind
+        builder = builder.updater(None).update_queue(IngestQueue())
+    application = builder.build()
+    
+    # Refresh the sender's session before any handler runs
+    application.add_handler(TypeHandler(Update, session_store.touch), group=-1)
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("search", search_command))
     application.add_handler(CommandHandler("playlist", playlist_command))
+    application.add_handler(CommandHandler("queue", queue_command))
     
     # Add message handlers
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
@@ -30,4 +107,12 @@ def create_application() -> Application:
     # Add callback query handler
     application.add_handler(CallbackQueryHandler(handle_callback))
     
-    return application 
\ No newline at end of file
+    return application
+
+def run(mode: str = BOT_MODE) -> None:
+    """Create the application and run it until interrupted."""
+    application = create_application(mode)
+    if mode == 'webhook':
+        run_webhook(application)
+    else:
+        application.run_polling()
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from sqlalchemy import bindparam, update
+from typing import Dict, Optional
+
+from .engine import get_engine
+from .models import Song
+
+DOWNLOAD_COUNT_FLUSH_INTERVAL = float(os.getenv('DOWNLOAD_COUNT_FLUSH_INTERVAL', '5'))
+
+class DownloadCounter:
+    """Buffer download count increments in memory and write them back in batches."""
+
+    def __init__(self, flush_interval: float = DOWNLOAD_COUNT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, int] = defaultdict(int)
+        # The batch being written; still counted as pending until it commits
+        self._flushing: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        # Held for a whole flush, so a final flush on stop waits out a periodic one
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def increment(self, song_id: int, amount: int = 1) -> None:
+        """Record an increment without touching the database."""
+        with self._lock:
+            self._pending[song_id] += amount
+
+    def pending(self, song_id: int) -> int:
+        """Get the increments for a song that have not been flushed yet."""
+        with self._lock:
+            return self._pending.get(song_id, 0) + self._flushing.get(song_id, 0)
+
+    def flush(self) -> int:
+        """Apply all buffered increments in one batched UPDATE; returns rows written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, defaultdict(int)
+            self._flushing = batch
+        
+        statement = update(Song.__table__).where(
+            Song.__table__.c.song_id == bindparam('b_song_id')
+        ).values(download_count=Song.__table__.c.download_count + bindparam('b_amount'))
+        try:
+            with get_engine().begin() as conn:
+                conn.execute(statement, [
+                    {'b_song_id': song_id, 'b_amount': amount}
+                    for song_id, amount in batch.items()
+                ])
+            with self._lock:
+                self._flushing = {}
+            return len(batch)
+        except Exception as e:
+            print(f"Error flushing download counts: {e}")
+            # Put the batch back so the increments are retried on the next flush
+            with self._lock:
+                for song_id, amount in batch.items():
+                    self._pending[song_id] += amount
+                self._flushing = {}
+            return 0
+
+    async def _run(self, executor) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await loop.run_in_executor(executor, self.flush)
+
+    def start(self, executor=None) -> None:
+        """Start flushing periodically on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(executor))
+
+    async def stop(self, executor=None) -> None:
+        """Stop the periodic flush and write out whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(executor, self.flush)
+
+download_counter = DownloadCounter()
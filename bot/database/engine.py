@@ -0,0 +1,81 @@
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+from typing import Optional
+
+from config import DB_URL
+
+# Pool tuning, overridable from the environment
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+# SQLite pragmas applied to every new connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # Negative means KiB, so 64 MiB
+
+_engine: Optional[Engine] = None
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Put each SQLite connection in WAL mode so readers don't block on a writer."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+def create_db_engine(url: str = DB_URL) -> Engine:
+    """Create a pooled engine for the given URL, tuned for its backend."""
+    db_url = make_url(url)
+    kwargs = {'pool_pre_ping': True}
+    
+    if db_url.get_backend_name() == 'sqlite':
+        in_memory = db_url.database in (None, '', ':memory:')
+        # Connections are handed between the DB executor threads
+        kwargs['connect_args'] = {'check_same_thread': False}
+        if in_memory:
+            # Every connection to :memory: is a separate database, so share one
+            kwargs['poolclass'] = StaticPool
+        else:
+            kwargs.update(
+                poolclass=QueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT
+            )
+        engine = create_engine(db_url, **kwargs)
+        event.listen(engine, 'connect', _apply_sqlite_pragmas)
+        return engine
+    
+    kwargs.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE
+    )
+    return create_engine(db_url, **kwargs)
+
+def get_engine() -> Engine:
+    """Get the shared engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_db_engine()
+    return _engine
+
+def set_engine(engine: Engine) -> Optional[Engine]:
+    """Replace the shared engine, e.g. with a scratch database; returns the previous one."""
+    global _engine
+    previous, _engine = _engine, engine
+    return previous
+
+def dispose_engine() -> None:
+    """Close all pooled connections; the shared engine reconnects on next use."""
+    if _engine is not None:
+        _engine.dispose()
@@ -0,0 +1,61 @@
+import re
+import unicodedata
+from sqlalchemy import column, table, text
+from sqlalchemy.engine import Connection
+from typing import Iterable, List, Optional, Tuple
+
+LIBRARY_SEARCH_MAX_TERMS = 8
+LIBRARY_INDEX_DIALECT = 'sqlite'  # FTS5 is SQLite's; other backends go without the index
+
+# Full-text index of every library entry (rowid = song_id). Each word is indexed
+# as a "<user_id>x<word>" token, so a term's doclist holds only that user's songs
+# and a lookup costs the user's matches rather than the whole catalog's.
+library_fts = table('library_fts', column('rowid'), column('title'), column('artist'))
+
+# Rank title matches above artist matches
+LIBRARY_RANK = (2.0, 1.0)
+
+LIBRARY_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS library_fts USING fts5("
+    "title, artist, tokenize='unicode61 remove_diacritics 2')",
+)
+
+_WORD = re.compile(r'[^\W_]+')
+
+def _words(value: Optional[str]) -> List[str]:
+    # Split where the unicode61 tokenizer does, so indexed and queried tokens agree
+    return _WORD.findall(unicodedata.normalize('NFKC', value or '').lower())
+
+def library_terms(user_id: int, value: Optional[str]) -> str:
+    """Scope each word of a title or artist to the user whose library it is in."""
+    return ' '.join(f"{user_id}x{word}" for word in _words(value))
+
+def library_match_expression(user_id: int, query: str, prefix: bool = False) -> Optional[str]:
+    """Turn free text into an FTS5 query for the user's songs matching every word.
+
+    With prefix, the last word also matches longer words; None when there is nothing to match.
+    """
+    words = _words(query)[:LIBRARY_SEARCH_MAX_TERMS]
+    if not words or (prefix and len(words[-1]) < 2):
+        return None
+    # Quoting each term keeps FTS operators in the user's text from being parsed
+    expression = ' '.join(f'"{user_id}x{word}"' for word in words)
+    return expression + '*' if prefix else expression
+
+def create_library_index(conn: Connection) -> None:
+    """Create the library full-text index if it is missing."""
+    for statement in LIBRARY_INDEX_DDL:
+        conn.execute(text(statement))
+
+def index_songs(conn, songs: Iterable[Tuple[int, int, Optional[str], Optional[str]]]) -> None:
+    """Add (song_id, user_id, title, artist) library entries to the index."""
+    rows = [
+        {'rowid': song_id, 'title': library_terms(user_id, title), 'artist': library_terms(user_id, artist)}
+        for song_id, user_id, title, artist in songs
+    ]
+    if rows:
+        conn.execute(library_fts.insert(), rows)
+
+def unindex_songs(conn, song_ids: List[int]) -> None:
+    """Remove library entries from the index."""
+    conn.execute(library_fts.delete().where(library_fts.c.rowid.in_(song_ids)))
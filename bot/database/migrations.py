@@ -0,0 +1,215 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from .engine import get_engine
+from .library_index import LIBRARY_INDEX_DIALECT, create_library_index, index_songs
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    dialects: Optional[Tuple[str, ...]] = None  # Backends its SQL runs on; None for any
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, name: str, dialects: Optional[Tuple[str, ...]] = None):
+    """Register a schema upgrade step; versions must be applied in increasing order."""
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, name, func, dialects))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
+
+@migration(1, "index lookup columns and make playlist membership unique", dialects=('sqlite',))
+def _index_lookup_columns(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_songs_user_id ON songs (user_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_songs_file_id ON songs (file_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_playlists_user_id ON playlists (user_id)"))
+    
+    # Old databases may hold duplicate memberships; keep the first of each
+    conn.execute(text(
+        "DELETE FROM playlist_songs WHERE rowid NOT IN ("
+        "SELECT MIN(rowid) FROM playlist_songs GROUP BY playlist_id, song_id)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_playlist_songs_playlist_song "
+        "ON playlist_songs (playlist_id, song_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_playlist_songs_song_id ON playlist_songs (song_id)"))
+
+@migration(2, "index playlist membership in keyset order")
+def _index_playlist_position(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_playlist_songs_position "
+        "ON playlist_songs (playlist_id, added_at, song_id)"
+    ))
+
+@migration(3, "record the source track of each song")
+def _add_song_source_id(conn: Connection) -> None:
+    columns = {column['name'] for column in inspect(conn).get_columns('songs')}
+    if 'source_id' not in columns:
+        conn.execute(text("ALTER TABLE songs ADD COLUMN source_id VARCHAR(255)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_songs_source_id ON songs (source_id)"))
+
+@migration(4, "split songs into a shared track catalog and per-user library entries", dialects=('sqlite',))
+def _split_track_catalog(conn: Connection) -> None:
+    # Rows with the same source are one track; without a source only identical uploads are
+    key = "COALESCE(source_id, 'file:' || file_id, 'song:' || song_id)"
+    conn.execute(text(
+        f"CREATE TEMP TABLE song_keys AS SELECT song_id, user_id, download_count, added_at, "
+        f"{key} AS track_key FROM songs"
+    ))
+    conn.execute(text(
+        "CREATE TEMP TABLE track_keys AS "
+        "SELECT track_key, MIN(song_id) AS track_id FROM song_keys GROUP BY track_key"
+    ))
+    
+    conn.execute(text(
+        "CREATE TABLE tracks ("
+        "track_id INTEGER PRIMARY KEY, "
+        "source_id VARCHAR(255), "
+        "title VARCHAR(255), "
+        "artist VARCHAR(255), "
+        "duration INTEGER, "
+        "file_id VARCHAR(512), "
+        "created_at DATETIME)"
+    ))
+    conn.execute(text(
+        "INSERT INTO tracks (track_id, source_id, title, artist, duration, file_id, created_at) "
+        "SELECT s.song_id, s.source_id, s.title, s.artist, s.duration, s.file_id, s.added_at "
+        "FROM track_keys t JOIN songs s ON s.song_id = t.track_id"
+    ))
+    
+    # Fold each user's duplicate rows for a track into the oldest one
+    conn.execute(text(
+        "CREATE TEMP TABLE library_entries AS "
+        "SELECT user_id, track_key, MIN(song_id) AS song_id, "
+        "SUM(COALESCE(download_count, 0)) AS download_count, MIN(added_at) AS added_at "
+        "FROM song_keys GROUP BY user_id, track_key"
+    ))
+    conn.execute(text(
+        "CREATE TEMP TABLE folded_songs AS "
+        "SELECT k.song_id AS old_id, e.song_id AS new_id FROM song_keys k "
+        "JOIN library_entries e ON e.user_id IS k.user_id AND e.track_key = k.track_key "
+        "WHERE k.song_id != e.song_id"
+    ))
+    conn.execute(text(
+        "INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id, added_at) "
+        "SELECT ps.playlist_id, f.new_id, ps.added_at FROM playlist_songs ps "
+        "JOIN folded_songs f ON f.old_id = ps.song_id"
+    ))
+    conn.execute(text("DELETE FROM playlist_songs WHERE song_id IN (SELECT old_id FROM folded_songs)"))
+    
+    conn.execute(text(
+        "CREATE TABLE songs_library ("
+        "song_id INTEGER PRIMARY KEY, "
+        "user_id INTEGER REFERENCES users (user_id), "
+        "track_id INTEGER REFERENCES tracks (track_id), "
+        "download_count INTEGER, "
+        "added_at DATETIME)"
+    ))
+    conn.execute(text(
+        "INSERT INTO songs_library (song_id, user_id, track_id, download_count, added_at) "
+        "SELECT e.song_id, e.user_id, t.track_id, e.download_count, e.added_at "
+        "FROM library_entries e JOIN track_keys t ON t.track_key = e.track_key"
+    ))
+    conn.execute(text("DROP TABLE songs"))
+    conn.execute(text("ALTER TABLE songs_library RENAME TO songs"))
+    
+    conn.execute(text("CREATE UNIQUE INDEX ux_tracks_source_id ON tracks (source_id)"))
+    conn.execute(text("CREATE INDEX ix_tracks_file_id ON tracks (file_id)"))
+    conn.execute(text("CREATE INDEX ix_songs_user_id ON songs (user_id)"))
+    conn.execute(text("CREATE INDEX ix_songs_track_id ON songs (track_id)"))
+    conn.execute(text("CREATE UNIQUE INDEX ux_songs_user_id_track_id ON songs (user_id, track_id)"))
+    for table in ('song_keys', 'track_keys', 'library_entries', 'folded_songs'):
+        conn.execute(text(f"DROP TABLE temp.{table}"))
+
+@migration(5, "index each library's titles and artists for full-text search")
+def _add_library_index(conn: Connection) -> None:
+    if conn.dialect.name != LIBRARY_INDEX_DIALECT:
+        # FTS5 is SQLite's; other backends search remotely only
+        return
+    create_library_index(conn)
+    conn.execute(text("DELETE FROM library_fts"))
+    # Index existing libraries in song_id batches
+    after_id = 0
+    while True:
+        songs = conn.execute(text(
+            "SELECT s.song_id, s.user_id, t.title, t.artist FROM songs s "
+            "JOIN tracks t ON t.track_id = s.track_id "
+            "WHERE s.song_id > :after_id ORDER BY s.song_id LIMIT 5000"
+        ), {'after_id': after_id}).all()
+        if not songs:
+            break
+        index_songs(conn, songs)
+        after_id = songs[-1][0]
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255), "
+        "applied_at DATETIME)"
+    ))
+
+def get_schema_version(conn: Connection) -> int:
+    """Get the highest migration version applied to the database."""
+    _ensure_version_table(conn)
+    version = conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar()
+    return version or 0
+
+def _record(conn: Connection, step: Migration) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+        {'version': step.version, 'name': step.name, 'applied_at': datetime.utcnow()}
+    )
+
+def stamp_head(engine: Optional[Engine] = None) -> None:
+    """Mark every migration as applied, for databases just built by create_all."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+        for step in MIGRATIONS:
+            if step.version > current:
+                _record(conn, step)
+
+def run_migrations(engine: Optional[Engine] = None, target: Optional[int] = None) -> int:
+    """Apply pending migrations in order, each in its own transaction, up to target if given."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        current = get_schema_version(conn)
+    
+    # Refuse up front rather than leave the schema half upgraded
+    pending = [
+        step for step in MIGRATIONS
+        if step.version > current and (target is None or step.version <= target)
+    ]
+    unsupported = [step for step in pending if step.dialects and engine.dialect.name not in step.dialects]
+    if unsupported:
+        steps = ', '.join(f"{step.version} ({'/'.join(step.dialects)} only)" for step in unsupported)
+        raise RuntimeError(
+            f"Cannot migrate this {engine.dialect.name} database in place: migrations {steps}. "
+            "Upgrade it on a supported backend or rebuild it from scratch."
+        )
+    
+    for step in MIGRATIONS:
+        if step.version <= current:
+            continue
+        if target is not None and step.version > target:
+            break
+        with engine.begin() as conn:
+            step.upgrade(conn)
+            _record(conn, step)
+        print(f"Applied migration {step.version}: {step.name}")
+        current = step.version
+    return current
+
+def is_fresh_database(engine: Optional[Engine] = None) -> bool:
+    """Check whether the database has no tables yet."""
+    engine = engine or get_engine()
+    return not inspect(engine).has_table('songs')
+
+if __name__ == '__main__':
+    print(f"Database at schema version {run_migrations()}")
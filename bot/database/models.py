@@ -1,9 +1,12 @@
 from datetime import datetime
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Table
+from sqlalchemy import event, text, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, Table
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from config import DB_URL
+from typing import List, NamedTuple, Optional
+from .engine import get_engine, dispose_engine
+from .library_index import LIBRARY_INDEX_DIALECT, create_library_index
+from .migrations import is_fresh_database, run_migrations, stamp_head
 
 Base = declarative_base()
 
@@ -11,9 +14,11 @@ Base = declarative_base()
 playlist_songs = Table(
     'playlist_songs',
     Base.metadata,
-    Column('playlist_id', Integer, ForeignKey('playlists.playlist_id')),
-    Column('song_id', Integer, ForeignKey('songs.song_id')),
-    Column('added_at', DateTime, default=datetime.utcnow)
+    Column('playlist_id', Integer, ForeignKey('playlists.playlist_id'), primary_key=True),
+    Column('song_id', Integer, ForeignKey('songs.song_id'), primary_key=True, index=True),
+    Column('added_at', DateTime, default=datetime.utcnow),
+    # Keyset order for paging through a playlist
+    Index('ix_playlist_songs_position', 'playlist_id', 'added_at', 'song_id')
 )
 
 class User(Base):
@@ -32,7 +37,7 @@ class Playlist(Base):
     __tablename__ = 'playlists'
     
     playlist_id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.user_id'))
+    user_id = Column(Integer, ForeignKey('users.user_id'), index=True)
     name = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -40,38 +45,162 @@ class Playlist(Base):
     user = relationship('User', back_populates='playlists')
     songs = relationship('Song', secondary=playlist_songs, back_populates='playlists')
 
-class Song(Base):
-    __tablename__ = 'songs'
+class Track(Base):
+    """A track in the shared catalog; its metadata and upload are stored once for all users."""
+    __tablename__ = 'tracks'
+    __table_args__ = (
+        Index('ux_tracks_source_id', 'source_id', unique=True),
+    )
     
-    song_id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.user_id'))
+    track_id = Column(Integer, primary_key=True)
+    source_id = Column(String(255))  # Search result id/URL
     title = Column(String(255))
     artist = Column(String(255))
     duration = Column(Integer)  # Duration in seconds
-    file_id = Column(String(512))  # Telegram file_id for offline access
+    file_id = Column(String(512), index=True)  # Telegram file_id for offline access
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    songs = relationship('Song', back_populates='track')
+
+class Song(Base):
+    """A track in one user's library."""
+    __tablename__ = 'songs'
+    __table_args__ = (
+        Index('ux_songs_user_id_track_id', 'user_id', 'track_id', unique=True),
+    )
+    
+    song_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id'), index=True)
+    track_id = Column(Integer, ForeignKey('tracks.track_id'), index=True)
     download_count = Column(Integer, default=0)
     added_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship('User', back_populates='songs')
+    track = relationship('Track', back_populates='songs')
     playlists = relationship('Playlist', secondary=playlist_songs, back_populates='songs')
 
+# The library index lives outside the ORM; build it wherever create_all builds
+# songs, so fresh databases stamped at head get it too
+@event.listens_for(Song.__table__, 'after_create')
+def _create_library_index(target, connection, **kw):
+    if connection.dialect.name == LIBRARY_INDEX_DIALECT:
+        create_library_index(connection)
+
+@event.listens_for(Song.__table__, 'before_drop')
+def _drop_library_index(target, connection, **kw):
+    if connection.dialect.name == LIBRARY_INDEX_DIALECT:
+        connection.execute(text("DROP TABLE IF EXISTS library_fts"))
+
+# Download job states
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+class DownloadJob(Base):
+    __tablename__ = 'download_jobs'
+    __table_args__ = (
+        # Workers reload unfinished jobs in submission order on startup
+        Index('ix_download_jobs_status_job_id', 'status', 'job_id'),
+    )
+    
+    job_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id'), index=True)
+    chat_id = Column(Integer)
+    message_id = Column(Integer)  # Bot message that shows the job's progress
+    track = Column(Text)  # Search result as JSON
+    status = Column(String(16), default=JOB_PENDING)
+    error = Column(String(512))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserState(Base):
+    __tablename__ = 'user_states'
+    
+    user_id = Column(Integer, primary_key=True)
+    state = Column(Text, nullable=False)  # Conversation state (user_data) as JSON
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DownloadJobView(NamedTuple):
+    """Immutable read model of a download job."""
+    job_id: int
+    user_id: int
+    chat_id: int
+    message_id: int
+    track: dict
+    status: str
+
+class SongView(NamedTuple):
+    """Immutable read model of a song row, as handed to the handlers."""
+    song_id: int
+    title: str
+    artist: str
+    duration: int
+    file_id: str
+    user_id: int
+    download_count: int
+
+# Columns selected for SongView, in field order; select from Song joined to Track
+SONG_VIEW_COLUMNS = (
+    Song.song_id,
+    Track.title,
+    Track.artist,
+    Track.duration,
+    Track.file_id,
+    Song.user_id,
+    Song.download_count
+)
+
+class PlaylistPage(NamedTuple):
+    """One keyset page of a playlist.
+
+    after_key is the song_id just before the page (None on the first page) and
+    next_key is the last song_id on the page (None when there is no next page).
+    playlist_id and name are None when the user has no such playlist.
+    """
+    songs: List[SongView]
+    after_key: Optional[int]
+    next_key: Optional[int]
+    playlist_id: Optional[int] = None
+    name: Optional[str] = None
+
+class PlaylistSummary(NamedTuple):
+    """A playlist with its song count and total duration in seconds."""
+    playlist_id: int
+    name: str
+    song_count: int
+    total_duration: int
+    created_at: datetime
+
 def recreate_database():
     """Drop all tables and recreate them."""
+    # Release pooled connections before removing the file underneath them
+    dispose_engine()
+    
     # Remove existing database file
     if os.path.exists('bot.db'):
         os.remove('bot.db')
     
-    # Create engine and recreate all tables
-    engine = create_engine(DB_URL)
+    # Recreate all tables on the shared engine
+    engine = get_engine()
     Base.metadata.drop_all(engine)
     Base.metadata.create_all(engine)
+    stamp_head(engine)
     print("Database recreated successfully!")
 
 # Create database and tables
 def init_db():
-    engine = create_engine(DB_URL)
-    Base.metadata.create_all(engine)
+    engine = get_engine()
+    if is_fresh_database(engine):
+        # create_all builds the current schema, so there is nothing to migrate
+        Base.metadata.create_all(engine)
+        stamp_head(engine)
+    else:
+        # Bring existing databases up to date in place, then add any new tables
+        run_migrations(engine)
+        Base.metadata.create_all(engine)
 
 if __name__ == '__main__':
     recreate_database() 
\ No newline at end of file
@@ -1,27 +1,133 @@
-from sqlalchemy import create_engine
+import asyncio
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import bindparam, delete, func, literal, literal_column, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 
-from config import DB_URL
-from .models import Base, User, Playlist, Song
+from .counters import download_counter
+from .engine import get_engine
+from .library_index import (
+    LIBRARY_INDEX_DIALECT, LIBRARY_RANK, index_songs, library_fts, library_match_expression, unindex_songs
+)
+from bot.utils.metrics import db_query_errors, db_query_seconds
+from bot.utils.tracing import tracer
+from .models import (
+    Base, User, Playlist, PlaylistPage, PlaylistSummary, Song, SongView, SONG_VIEW_COLUMNS, Track, playlist_songs,
+    DownloadJob, DownloadJobView, JOB_PENDING, JOB_RUNNING
+)
 
-# Create database engine and session
-engine = create_engine(DB_URL)
+# Share the tuned, pooled engine with every other database path
+engine = get_engine()
 SessionLocal = sessionmaker(bind=engine)
 session_factory = sessionmaker(bind=engine)
 Session = scoped_session(session_factory)
 
+# Bounded pool of worker threads that run the blocking SQLAlchemy calls, so the
+# event loop keeps serving other users while a query waits on disk I/O.
+DB_MAX_WORKERS = int(os.getenv('DB_MAX_WORKERS', '4'))
+PLAYLIST_PAGE_SIZE = int(os.getenv('PLAYLIST_PAGE_SIZE', '10'))
+LIBRARY_BATCH_SIZE = int(os.getenv('LIBRARY_BATCH_SIZE', '500'))
+PLAYLIST_NAME_LENGTH = 255  # Playlist.name column size
+DEFAULT_PLAYLIST_NAME = "My Music"
+LIBRARY_SEARCH_LIMIT = int(os.getenv('LIBRARY_SEARCH_LIMIT', '5'))
+executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix='db')
+# The DatabaseManager method running on each executor thread, for error counts
+_running = threading.local()
+
+def report_query_error(message: str) -> None:
+    """Log an error a DatabaseManager method handled itself and count it against the method."""
+    print(message)
+    db_query_errors.inc(getattr(_running, 'method', None) or 'unknown')
+
+def run_in_executor(func):
+    """Turn a blocking DatabaseManager method into a coroutine run on the DB executor."""
+    name = func.__name__
+
+    def timed(*args, **kwargs):
+        _running.method = name
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            db_query_errors.inc(name)
+            raise
+        finally:
+            db_query_seconds.observe(time.perf_counter() - start, name)
+            _running.method = None
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        with tracer.span(f"db.{name}"):
+            return await loop.run_in_executor(executor, functools.partial(timed, self, *args, **kwargs))
+    return wrapper
+
+# Per-user playlist versions, bumped after every committed playlist change so
+# rendered views can be cached until the playlist actually changes. Values come
+# from one global counter, so a version is never reused.
+_playlist_versions = {}
+_version_counter = itertools.count(1)
+
+# Best matches for a full-text expression, ranked by bm25 in the index itself;
+# every indexed token is scoped to its user, so no other library is ranked
+_library_matches = select(
+    library_fts.c.rowid.label('song_id'),
+    func.bm25(literal_column('library_fts'), *LIBRARY_RANK).label('score')
+).where(
+    literal_column('library_fts').op('MATCH')(bindparam('expression'))
+).order_by('score', library_fts.c.rowid.desc()).limit(bindparam('limit')).subquery()
+LIBRARY_SEARCH = select(*SONG_VIEW_COLUMNS).select_from(_library_matches).join(
+    Song, Song.song_id == _library_matches.c.song_id
+).join(
+    Track, Track.track_id == Song.track_id
+).where(Song.user_id == bindparam('user_id')).order_by(_library_matches.c.score, Song.song_id.desc())
+
+def has_library_index(session) -> bool:
+    """Check whether the session's database keeps the library full-text index."""
+    return session.get_bind().dialect.name == LIBRARY_INDEX_DIALECT
+
+def insert_ignore(session, table):
+    """Build an INSERT that skips rows violating a unique constraint."""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return table.insert().prefix_with('IGNORE')
+
+def bind_sessions(new_engine) -> None:
+    """Bind DatabaseManager sessions to another engine, e.g. a scratch database."""
+    Session.remove()
+    SessionLocal.configure(bind=new_engine)
+    session_factory.configure(bind=new_engine)
+
 class DatabaseManager:
     def __init__(self):
         self.Session = Session
+        self.download_counter = download_counter
 
     def get_session(self):
         """Get a new session."""
         return self.Session()
 
+    def get_playlist_version(self, user_id: int) -> int:
+        """Get the version of the user's playlist; it changes whenever the playlist does."""
+        return _playlist_versions.get(user_id, 0)
+
+    def _bump_playlist_version(self, user_id: int) -> None:
+        _playlist_versions[user_id] = next(_version_counter)
+
     # User operations
+    @run_in_executor
     def create_user(self, user_id: int, username: str) -> Optional[User]:
         """Create a new user if not exists."""
         session = self.get_session()
@@ -34,270 +140,641 @@ class DatabaseManager:
                 session.refresh(user)
             return user
         except SQLAlchemyError as e:
-            print(f"Error creating user: {e}")
+            report_query_error(f"Error creating user: {e}")
             session.rollback()
             return None
         finally:
             session.close()
 
+    @run_in_executor
     def get_user(self, user_id: int) -> Optional[User]:
         """Get user by ID."""
         session = self.get_session()
         try:
-            user = session.query(User).filter(User.user_id == user_id).first()
-            if user:
-                session.refresh(user)
-            return user
+            # A fresh query already loads every column; refreshing would re-select the row
+            return session.query(User).filter(User.user_id == user_id).first()
         except SQLAlchemyError as e:
-            print(f"Error getting user: {e}")
+            report_query_error(f"Error getting user: {e}")
             return None
         finally:
             session.close()
 
     # Playlist operations
+    @run_in_executor
     def get_or_create_user_playlist(self, user_id: int) -> Optional[Playlist]:
         """Get the user's default playlist or create it if it doesn't exist."""
         try:
             with Session() as session:
-                playlist = session.query(Playlist).filter(Playlist.user_id == user_id).first()
+                playlist = session.query(Playlist).filter(
+                    Playlist.user_id == user_id
+                ).order_by(Playlist.playlist_id).first()
                 if not playlist:
                     # Create default playlist for user
                     playlist = Playlist(
                         user_id=user_id,
-                        name="My Music"
+                        name=DEFAULT_PLAYLIST_NAME
                     )
                     session.add(playlist)
                     session.commit()
                     session.refresh(playlist)
                 return playlist
         except Exception as e:
-            print(f"Error getting/creating playlist: {e}")
+            report_query_error(f"Error getting/creating playlist: {e}")
+            return None
+
+    @run_in_executor
+    def create_playlist(self, user_id: int, name: str) -> Optional[PlaylistSummary]:
+        """Create a new, empty playlist for the user."""
+        name = name.strip()[:PLAYLIST_NAME_LENGTH]
+        if not name:
             return None
+        session = self.get_session()
+        try:
+            # The default playlist is the user's oldest, so make sure it exists first;
+            # otherwise this one would become the target of every download
+            self._get_playlist_id(session, user_id, create=True)
+            playlist = Playlist(user_id=user_id, name=name)
+            session.add(playlist)
+            session.flush()
+            # Read the row before committing expires it
+            summary = PlaylistSummary(playlist.playlist_id, playlist.name, 0, 0, playlist.created_at)
+            session.commit()
+            return summary
+        except SQLAlchemyError as e:
+            report_query_error(f"Error creating playlist: {e}")
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    @run_in_executor
+    def rename_playlist(self, user_id: int, playlist_id: int, name: str) -> bool:
+        """Rename one of the user's playlists."""
+        name = name.strip()[:PLAYLIST_NAME_LENGTH]
+        if not name:
+            return False
+        session = self.get_session()
+        try:
+            # Filtering on the owner keeps users from renaming each other's playlists
+            renamed = session.execute(
+                update(Playlist)
+                .where(Playlist.playlist_id == playlist_id, Playlist.user_id == user_id)
+                .values(name=name)
+            ).rowcount
+            session.commit()
+            if renamed:
+                # Rendered pages show the name, so they go stale with it
+                self._bump_playlist_version(user_id)
+            return renamed > 0
+        except SQLAlchemyError as e:
+            report_query_error(f"Error renaming playlist: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    @run_in_executor
+    def get_user_playlists(self, user_id: int) -> List[PlaylistSummary]:
+        """Get the user's playlists with song counts and total durations, in one query."""
+        session = self.get_session()
+        try:
+            # Outer joins keep empty playlists, which count 0 songs and 0 seconds
+            rows = session.query(
+                Playlist.playlist_id,
+                Playlist.name,
+                func.count(playlist_songs.c.song_id),
+                func.coalesce(func.sum(Track.duration), 0),
+                Playlist.created_at
+            ).outerjoin(
+                playlist_songs, playlist_songs.c.playlist_id == Playlist.playlist_id
+            ).outerjoin(
+                Song, Song.song_id == playlist_songs.c.song_id
+            ).outerjoin(
+                Track, Track.track_id == Song.track_id
+            ).filter(
+                Playlist.user_id == user_id
+            ).group_by(
+                Playlist.playlist_id, Playlist.name, Playlist.created_at
+            ).order_by(Playlist.playlist_id).all()
+            return [PlaylistSummary(*row) for row in rows]
+        except SQLAlchemyError as e:
+            report_query_error(f"Error getting user playlists: {e}")
+            return []
+        finally:
+            session.close()
+
+    def _song_views(self, session):
+        """Query SongView columns: library entries joined to their catalog tracks."""
+        return session.query(*SONG_VIEW_COLUMNS).select_from(Song).join(
+            Track, Track.track_id == Song.track_id
+        )
+
+    def _get_playlist(self, session, user_id: int, playlist_id: Optional[int] = None):
+        """Get (playlist_id, name) of one of the user's playlists, or of their default one."""
+        playlists = session.query(Playlist.playlist_id, Playlist.name).filter(Playlist.user_id == user_id)
+        if playlist_id is not None:
+            # Filtering on the owner keeps users from reaching each other's playlists
+            return playlists.filter(Playlist.playlist_id == playlist_id).first()
+        return playlists.order_by(Playlist.playlist_id).first()
+
+    def _get_playlist_id(
+        self, session, user_id: int, playlist_id: Optional[int] = None, create: bool = False
+    ) -> Optional[int]:
+        """Get the id of one of the user's playlists or of their default one, optionally creating it."""
+        playlist = self._get_playlist(session, user_id, playlist_id)
+        if playlist is not None:
+            return playlist.playlist_id
+        if playlist_id is None and create:
+            playlist = Playlist(user_id=user_id, name=DEFAULT_PLAYLIST_NAME)
+            session.add(playlist)
+            session.flush()
+            return playlist.playlist_id
+        return None
+
+    def _insert_playlist_songs(self, session, playlist_id: int, user_id: int, song_ids: List[int]) -> int:
+        """Link the user's songs to a playlist in one INSERT ... SELECT, skipping existing rows."""
+        owned_songs = select(
+            literal(playlist_id),
+            Song.song_id,
+            literal(datetime.utcnow())
+        ).where(Song.user_id == user_id, Song.song_id.in_(song_ids))
+        
+        statement = insert_ignore(session, playlist_songs).from_select(
+            ['playlist_id', 'song_id', 'added_at'], owned_songs
+        )
+        return session.execute(statement).rowcount
+
+    def _delete_playlist_songs(self, session, playlist_id: int, song_ids: List[int]) -> int:
+        """Unlink songs from a playlist in one DELETE."""
+        statement = delete(playlist_songs).where(
+            playlist_songs.c.playlist_id == playlist_id,
+            playlist_songs.c.song_id.in_(song_ids)
+        )
+        return session.execute(statement).rowcount
 
-    def add_song_to_playlist(self, user_id: int, song_id: int) -> bool:
-        """Add a song to user's default playlist."""
+    @run_in_executor
+    def add_song_to_playlist(self, user_id: int, song_id: int, playlist_id: Optional[int] = None) -> bool:
+        """Add a song to one of the user's playlists, their default one unless given."""
         try:
             with Session() as session:
-                # Get or create user's playlist
-                playlist = session.query(Playlist).filter(Playlist.user_id == user_id).first()
-                if not playlist:
-                    playlist = Playlist(user_id=user_id, name="My Music")
-                    session.add(playlist)
-                    session.commit()
+                playlist_id = self._get_playlist_id(session, user_id, playlist_id, create=True)
+                if playlist_id is None:
+                    return False
+                added = self._insert_playlist_songs(session, playlist_id, user_id, [song_id])
+                session.commit()
+                if added:
+                    self._bump_playlist_version(user_id)
+                    return True
                 
-                # Get the song
-                song = session.query(Song).filter(
+                # Nothing inserted: either already in the playlist or not the user's song
+                return session.query(Song.song_id).filter(
                     Song.song_id == song_id,
                     Song.user_id == user_id
-                ).first()
-                
-                if not song:
-                    return False
-                
-                # Add song to playlist if not already there
-                if song not in playlist.songs:
-                    playlist.songs.append(song)
-                    session.commit()
-                return True
+                ).first() is not None
         except Exception as e:
-            print(f"Error adding song to playlist: {e}")
+            report_query_error(f"Error adding song to playlist: {e}")
             return False
 
-    def get_playlist_songs(self, user_id: int) -> List[Song]:
-        """Get all songs in user's playlist."""
+    @run_in_executor
+    def add_songs_to_playlist(self, user_id: int, song_ids: List[int], playlist_id: Optional[int] = None) -> int:
+        """Add several of the user's songs to a playlist, their default one unless given; returns how many were new."""
+        if not song_ids:
+            return 0
         try:
             with Session() as session:
-                playlist = session.query(Playlist).filter(Playlist.user_id == user_id).first()
-                if not playlist:
+                playlist_id = self._get_playlist_id(session, user_id, playlist_id, create=True)
+                if playlist_id is None:
+                    return 0
+                added = self._insert_playlist_songs(session, playlist_id, user_id, list(song_ids))
+                session.commit()
+                if added:
+                    self._bump_playlist_version(user_id)
+                return added
+        except Exception as e:
+            report_query_error(f"Error adding songs to playlist: {e}")
+            return 0
+
+    @run_in_executor
+    def get_playlist_songs(self, user_id: int, playlist_id: Optional[int] = None) -> List[SongView]:
+        """Get all songs in one of the user's playlists, their default one unless given."""
+        try:
+            with Session() as session:
+                playlist_id = self._get_playlist_id(session, user_id, playlist_id)
+                if playlist_id is None:
                     return []
                 
-                songs = []
-                for song in playlist.songs:
-                    song_data = {
-                        'song_id': song.song_id,
-                        'title': song.title,
-                        'artist': song.artist,
-                        'duration': song.duration,
-                        'file_id': song.file_id,
-                        'user_id': song.user_id,
-                        'download_count': song.download_count
-                    }
-                    songs.append(Song(**song_data))
-                return songs
+                rows = self._song_views(session).join(
+                    playlist_songs, playlist_songs.c.song_id == Song.song_id
+                ).filter(
+                    playlist_songs.c.playlist_id == playlist_id
+                ).order_by(playlist_songs.c.added_at, Song.song_id)
+                return [self._with_pending_count(row) for row in rows]
         except Exception as e:
-            print(f"Error getting playlist songs: {e}")
+            report_query_error(f"Error getting playlist songs: {e}")
             return []
 
-    def remove_song_from_playlist(self, user_id: int, song_id: int) -> bool:
-        """Remove a song from user's playlist."""
+    @run_in_executor
+    def get_playlist_page(
+        self,
+        user_id: int,
+        after_key: Optional[int] = None,
+        limit: int = PLAYLIST_PAGE_SIZE,
+        before_key: Optional[int] = None,
+        playlist_id: Optional[int] = None
+    ) -> PlaylistPage:
+        """Get one page of a user's playlist, keyed on the song_id before or after it.
+
+        Without a playlist_id the page comes from the user's default playlist.
+
+        Pages are read with a keyset on (added_at, song_id), so each call touches
+        only the rows it returns no matter how long the playlist is.
+        """
         try:
             with Session() as session:
-                playlist = session.query(Playlist).filter(Playlist.user_id == user_id).first()
-                if not playlist:
-                    return False
+                playlist = self._get_playlist(session, user_id, playlist_id)
+                if playlist is None:
+                    return PlaylistPage([], None, None)
+                playlist_id, name = playlist
                 
-                song = session.query(Song).filter(
-                    Song.song_id == song_id,
-                    Song.user_id == user_id
-                ).first()
+                position = tuple_(playlist_songs.c.added_at, playlist_songs.c.song_id)
+                rows = self._song_views(session).join(
+                    playlist_songs, playlist_songs.c.song_id == Song.song_id
+                ).filter(playlist_songs.c.playlist_id == playlist_id)
+                
+                anchor_id = before_key if before_key is not None else after_key
+                if anchor_id is not None:
+                    anchor_added_at = session.query(playlist_songs.c.added_at).filter(
+                        playlist_songs.c.playlist_id == playlist_id,
+                        playlist_songs.c.song_id == anchor_id
+                    ).scalar()
+                    if anchor_added_at is None:
+                        # The anchor song left the playlist; start over from the top
+                        after_key = before_key = None
+                    else:
+                        anchor = tuple_(anchor_added_at, anchor_id)
                 
-                if not song:
+                if before_key is not None:
+                    found = rows.filter(position < anchor).order_by(
+                        playlist_songs.c.added_at.desc(), Song.song_id.desc()
+                    ).limit(limit + 1).all()
+                    songs = [self._with_pending_count(row) for row in reversed(found[:limit])]
+                    after_key = found[limit].song_id if len(found) > limit else None
+                    return PlaylistPage(songs, after_key, songs[-1].song_id if songs else None, playlist_id, name)
+                
+                if after_key is not None:
+                    rows = rows.filter(position > anchor)
+                found = rows.order_by(
+                    playlist_songs.c.added_at, Song.song_id
+                ).limit(limit + 1).all()
+                songs = [self._with_pending_count(row) for row in found[:limit]]
+                next_key = songs[-1].song_id if len(found) > limit else None
+                return PlaylistPage(songs, after_key, next_key, playlist_id, name)
+        except Exception as e:
+            report_query_error(f"Error getting playlist page: {e}")
+            return PlaylistPage([], None, None)
+
+    @run_in_executor
+    def remove_song_from_playlist(self, user_id: int, song_id: int, playlist_id: Optional[int] = None) -> bool:
+        """Remove a song from one of the user's playlists, their default one unless given."""
+        try:
+            with Session() as session:
+                playlist_id = self._get_playlist_id(session, user_id, playlist_id)
+                if playlist_id is None:
                     return False
                 
-                if song in playlist.songs:
-                    playlist.songs.remove(song)
+                deleted = self._delete_playlist_songs(session, playlist_id, [song_id])
+                if deleted:
                     session.commit()
-                return True
+                    self._bump_playlist_version(user_id)
+                return deleted > 0
         except Exception as e:
-            print(f"Error removing song from playlist: {e}")
+            report_query_error(f"Error removing song from playlist: {e}")
             return False
 
+    @run_in_executor
+    def remove_songs_from_playlist(self, user_id: int, song_ids: List[int], playlist_id: Optional[int] = None) -> int:
+        """Remove several songs from one of the user's playlists; returns how many were removed."""
+        if not song_ids:
+            return 0
+        try:
+            with Session() as session:
+                playlist_id = self._get_playlist_id(session, user_id, playlist_id)
+                if playlist_id is None:
+                    return 0
+                
+                removed = self._delete_playlist_songs(session, playlist_id, list(song_ids))
+                session.commit()
+                if removed:
+                    self._bump_playlist_version(user_id)
+                return removed
+        except Exception as e:
+            report_query_error(f"Error removing songs from playlist: {e}")
+            return 0
+
     # Song operations
-    def add_song(self, title: str, artist: str, duration: int, file_id: str, user_id: int, download_count: int = 1) -> Optional[Song]:
-        """Add a new song to the database."""
+    @run_in_executor
+    def add_song(self, title: str, artist: str, duration: int, file_id: str, user_id: int, download_count: int = 1, source_id: Optional[str] = None) -> Optional[SongView]:
+        """Add a song to the user's library, sharing its catalog track with other users."""
         try:
             with Session() as session:
-                song = Song(
-                    title=title,
-                    artist=artist,
-                    duration=duration,
-                    file_id=file_id,
-                    user_id=user_id,
-                    download_count=download_count
-                )
-                session.add(song)
+                track_id = self._get_or_create_track_id(session, title, artist, duration, file_id, source_id)
+                
+                # A track already in the library just counts another download
+                song = session.query(Song).filter(
+                    Song.user_id == user_id,
+                    Song.track_id == track_id
+                ).first()
+                if song:
+                    song.download_count = Song.download_count + download_count
+                    session.flush()
+                else:
+                    song = Song(user_id=user_id, track_id=track_id, download_count=download_count)
+                    session.add(song)
+                    session.flush()
+                    if has_library_index(session):
+                        # Index the new entry under the catalog's title, which an earlier download set
+                        track = session.query(Track.title, Track.artist).filter(Track.track_id == track_id).one()
+                        index_songs(session, [(song.song_id, user_id, track.title, track.artist)])
+                song_id = song.song_id
                 session.commit()
-                # Refresh the song object to ensure it's bound to the session
-                session.refresh(song)
-                # Create a new dictionary with the song's attributes
-                song_data = {
-                    'song_id': song.song_id,
-                    'title': song.title,
-                    'artist': song.artist,
-                    'duration': song.duration,
-                    'file_id': song.file_id,
-                    'user_id': song.user_id,
-                    'download_count': song.download_count
-                }
-                return Song(**song_data)
+                
+                row = self._song_views(session).filter(Song.song_id == song_id).first()
+                return self._with_pending_count(row)
         except Exception as e:
-            print(f"Error adding song: {e}")
+            report_query_error(f"Error adding song: {e}")
             return None
 
-    def get_user_songs(self, user_id: int) -> List[Song]:
-        """Get all songs that belong to a user."""
+    def _get_or_create_track_id(self, session, title: str, artist: str, duration: int, file_id: str, source_id: Optional[str]) -> int:
+        """Find the catalog track for a source, adding it if it's new."""
+        if source_id:
+            session.execute(insert_ignore(session, Track.__table__).values(
+                source_id=source_id,
+                title=title,
+                artist=artist,
+                duration=duration,
+                file_id=file_id,
+                created_at=datetime.utcnow()
+            ))
+            return session.query(Track.track_id).filter(Track.source_id == source_id).scalar()
+        
+        # Without a source the upload itself is the only identity we have
+        track_id = session.query(Track.track_id).filter(Track.file_id == file_id).limit(1).scalar()
+        if track_id is None:
+            track = Track(title=title, artist=artist, duration=duration, file_id=file_id)
+            session.add(track)
+            session.flush()
+            track_id = track.track_id
+        return track_id
+
+    @run_in_executor
+    def get_user_songs(self, user_id: int) -> List[SongView]:
+        """Get all songs in a user's library with one joined query."""
+        try:
+            with Session() as session:
+                rows = self._song_views(session).filter(Song.user_id == user_id).order_by(Song.song_id)
+                return [self._with_pending_count(row) for row in rows]
+        except Exception as e:
+            report_query_error(f"Error getting user songs: {e}")
+            return []
+
+    @run_in_executor
+    def get_user_songs_after(self, user_id: int, after_id: Optional[int] = None, limit: int = LIBRARY_BATCH_SIZE) -> List[SongView]:
+        """Get the next batch of a user's library in song_id order, after the given song."""
         try:
             with Session() as session:
-                return session.query(Song).filter(Song.user_id == user_id).all()
+                rows = self._song_views(session).filter(Song.user_id == user_id)
+                if after_id is not None:
+                    rows = rows.filter(Song.song_id > after_id)
+                rows = rows.order_by(Song.song_id).limit(limit)
+                return [self._with_pending_count(row) for row in rows]
         except Exception as e:
-            print(f"Error getting user songs: {e}")
+            report_query_error(f"Error getting user songs: {e}")
             return []
 
-    def get_song_by_id(self, song_id: int) -> Optional[Song]:
+    async def iter_user_songs(self, user_id: int, batch_size: int = LIBRARY_BATCH_SIZE) -> AsyncIterator[SongView]:
+        """Stream a user's library in batches, one keyset query per batch.
+
+        Memory stays bounded by batch_size, and no connection is held between batches.
+        """
+        after_id = None
+        while True:
+            batch = await self.get_user_songs_after(user_id, after_id, batch_size)
+            for song in batch:
+                yield song
+            if len(batch) < batch_size:
+                return
+            after_id = batch[-1].song_id
+
+    @run_in_executor
+    def search_library(self, user_id: int, query: str, limit: int = LIBRARY_SEARCH_LIMIT) -> List[SongView]:
+        """Find songs in the user's library whose title or artist match every word, best first.
+
+        Whole words are tried first; only if nothing matches is the last word taken as a prefix.
+        Every match is ranked, so a lookup costs the number of the user's songs it
+        matches: well under a millisecond for most queries, a few milliseconds for a
+        word in thousands of titles or a short prefix.
+        """
+        try:
+            with Session() as session:
+                if not has_library_index(session):
+                    return []
+                for prefix in (False, True):
+                    expression = library_match_expression(user_id, query, prefix)
+                    if expression is None:
+                        continue
+                    rows = session.execute(LIBRARY_SEARCH, {
+                        'expression': expression,
+                        'user_id': user_id,
+                        'limit': limit
+                    }).all()
+                    if rows:
+                        return [self._with_pending_count(row) for row in rows]
+                return []
+        except SQLAlchemyError as e:
+            report_query_error(f"Error searching library: {e}")
+            return []
+
+    @run_in_executor
+    def get_song_by_id(self, song_id: int) -> Optional[SongView]:
         """Get a song by its ID."""
         try:
             with Session() as session:
-                song = session.query(Song).filter(Song.song_id == song_id).first()
-                if song:
-                    # Refresh the song object to ensure it's bound to the session
-                    session.refresh(song)
-                    # Create a new dictionary with the song's attributes
-                    song_data = {
-                        'song_id': song.song_id,
-                        'title': song.title,
-                        'artist': song.artist,
-                        'duration': song.duration,
-                        'file_id': song.file_id,
-                        'user_id': song.user_id,
-                        'download_count': song.download_count
-                    }
-                    return Song(**song_data)
-                return None
+                row = self._song_views(session).filter(Song.song_id == song_id).first()
+                return self._with_pending_count(row) if row else None
         except Exception as e:
-            print(f"Error getting song: {e}")
+            report_query_error(f"Error getting song: {e}")
             return None
 
-    def increment_download_count(self, song_id: int) -> bool:
-        """Increment the download count for a song."""
-        session = self.get_session()
+    async def increment_download_count(self, song_id: int) -> bool:
+        """Increment the download count for a song; the write is batched by download_counter."""
+        self.download_counter.increment(song_id)
+        return True
+
+    @run_in_executor
+    def get_download_count(self, song_id: int) -> Optional[int]:
+        """Get a song's download count, including increments not flushed yet."""
         try:
-            song = session.query(Song).filter(Song.song_id == song_id).first()
-            if song:
-                song.download_count += 1
+            with Session() as session:
+                count = session.query(Song.download_count).filter(Song.song_id == song_id).scalar()
+                if count is None:
+                    return None
+                return count + self.download_counter.pending(song_id)
+        except SQLAlchemyError as e:
+            report_query_error(f"Error getting download count: {e}")
+            return None
+
+    def _with_pending_count(self, row) -> SongView:
+        """Build a SongView with buffered download increments merged in."""
+        view = SongView._make(row)
+        pending = self.download_counter.pending(view.song_id)
+        return view._replace(download_count=view.download_count + pending) if pending else view
+
+    # Download queue operations
+    def _job_view(self, job: DownloadJob) -> DownloadJobView:
+        return DownloadJobView(
+            job.job_id, job.user_id, job.chat_id, job.message_id, json.loads(job.track), job.status
+        )
+
+    @run_in_executor
+    def create_download_job(self, user_id: int, chat_id: int, message_id: int, track: dict) -> Optional[DownloadJobView]:
+        """Persist a new pending download job."""
+        try:
+            with Session() as session:
+                job = DownloadJob(
+                    user_id=user_id,
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    track=json.dumps(track),
+                    status=JOB_PENDING
+                )
+                session.add(job)
                 session.commit()
-                session.refresh(song)
-                return True
-            return False
+                return self._job_view(job)
         except SQLAlchemyError as e:
-            print(f"Error incrementing download count: {e}")
-            session.rollback()
+            report_query_error(f"Error creating download job: {e}")
+            return None
+
+    @run_in_executor
+    def get_unfinished_download_jobs(self) -> List[DownloadJobView]:
+        """Get every job left pending or running, oldest first, and mark them all pending again."""
+        try:
+            with Session() as session:
+                # Jobs that were running when the bot stopped start over
+                session.execute(
+                    update(DownloadJob).where(DownloadJob.status == JOB_RUNNING).values(status=JOB_PENDING)
+                )
+                session.commit()
+                jobs = session.query(DownloadJob).filter(
+                    DownloadJob.status == JOB_PENDING
+                ).order_by(DownloadJob.job_id)
+                return [self._job_view(job) for job in jobs]
+        except SQLAlchemyError as e:
+            report_query_error(f"Error loading download jobs: {e}")
+            return []
+
+    @run_in_executor
+    def set_download_job_status(self, job_id: int, status: str, error: Optional[str] = None) -> bool:
+        """Move a download job to a new state."""
+        try:
+            with Session() as session:
+                result = session.execute(
+                    update(DownloadJob).where(DownloadJob.job_id == job_id).values(
+                        status=status,
+                        error=error[:512] if error else None,
+                        updated_at=datetime.utcnow()
+                    )
+                )
+                session.commit()
+                return result.rowcount > 0
+        except SQLAlchemyError as e:
+            report_query_error(f"Error updating download job: {e}")
             return False
-        finally:
-            session.close()
+
+    @run_in_executor
+    def get_user_queue(self, user_id: int, limit: int = 20) -> List[dict]:
+        """Get the user's most recent download jobs, oldest first."""
+        try:
+            with Session() as session:
+                jobs = session.query(DownloadJob).filter(
+                    DownloadJob.user_id == user_id
+                ).order_by(DownloadJob.job_id.desc()).limit(limit).all()
+                return [
+                    {
+                        'job_id': job.job_id,
+                        'song_name': json.loads(job.track).get('title', 'Unknown'),
+                        'status': job.status
+                    }
+                    for job in reversed(jobs)
+                ]
+        except SQLAlchemyError as e:
+            report_query_error(f"Error getting user queue: {e}")
+            return []
 
     # Cleanup operations
+    @run_in_executor
     def remove_song(self, song_id: int) -> bool:
         """Remove a song from the database."""
         session = self.get_session()
         try:
             song = session.query(Song).filter(Song.song_id == song_id).first()
             if song:
+                user_id = song.user_id
                 session.delete(song)
+                if has_library_index(session):
+                    unindex_songs(session, [song_id])
                 session.commit()
+                self._bump_playlist_version(user_id)
                 return True
             return False
         except SQLAlchemyError as e:
-            print(f"Error removing song: {e}")
+            report_query_error(f"Error removing song: {e}")
             session.rollback()
             return False
         finally:
             session.close()
 
+    @run_in_executor
     def remove_playlist(self, playlist_id: int) -> bool:
         """Remove a playlist."""
         session = self.get_session()
         try:
             playlist = session.query(Playlist).filter(Playlist.playlist_id == playlist_id).first()
             if playlist:
+                user_id = playlist.user_id
                 session.delete(playlist)
                 session.commit()
+                self._bump_playlist_version(user_id)
                 return True
             return False
         except SQLAlchemyError as e:
-            print(f"Error removing playlist: {e}")
+            report_query_error(f"Error removing playlist: {e}")
             session.rollback()
             return False
         finally:
             session.close()
 
-    def get_song_by_file_id(self, file_id: str) -> Optional[Song]:
-        """Get song by file_id."""
-        session = self.get_session()
+    @run_in_executor
+    def get_file_id_by_source(self, source_id: str) -> Optional[str]:
+        """Get a Telegram file_id already uploaded for a source track, by any user."""
+        if not source_id:
+            return None
         try:
-            song = session.query(Song).filter(Song.file_id == file_id).first()
-            if song:
-                session.refresh(song)
-            return song
+            with Session() as session:
+                return session.query(Track.file_id).filter(
+                    Track.source_id == source_id,
+                    Track.file_id.isnot(None)
+                ).limit(1).scalar()
         except SQLAlchemyError as e:
-            print(f"Error getting song by file_id: {e}")
+            report_query_error(f"Error getting file_id by source: {e}")
             return None
-        finally:
-            session.close()
 
-    def get_user_songs(self, user_id: int) -> List[Song]:
-        """Get all songs that belong to a user's playlists."""
+    @run_in_executor
+    def get_song_by_file_id(self, file_id: str) -> Optional[SongView]:
+        """Get song by file_id."""
         try:
             with Session() as session:
-                # Get all playlists for the user
-                playlists = session.query(Playlist).filter(Playlist.user_id == user_id).all()
-                
-                # Get all unique songs from all user's playlists
-                songs = set()
-                for playlist in playlists:
-                    for song in playlist.songs:
-                        songs.add(song)
-                
-                return list(songs)
-        except Exception as e:
-            print(f"Error getting user songs: {e}")
-            return [] 
\ No newline at end of file
+                row = self._song_views(session).filter(Track.file_id == file_id).first()
+                return self._with_pending_count(row) if row else None
+        except SQLAlchemyError as e:
+            report_query_error(f"Error getting song by file_id: {e}")
+            return None
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from telegram.ext import BasePersistence, PersistenceInput
+from typing import Dict, Optional, Set
+
+from .engine import get_engine
+from .models import UserState
+from .operations import executor
+from bot.utils.session_store import UserSession
+
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '5'))
+PERSISTENCE_FLUSH_DELAY = float(os.getenv('PERSISTENCE_FLUSH_DELAY', '1'))
+PERSISTENCE_BATCH_SIZE = 500  # Rows per DELETE ... IN, well under SQLite's variable limit
+
+_MISSING = object()
+
+class DatabasePersistence(BasePersistence):
+    """Persist each user's session as one JSON row in the bot database.
+
+    Sessions are loaded on a user's first update instead of at startup, and
+    only sessions whose state changed are written, batched on a short timer.
+    """
+
+    def __init__(
+        self,
+        update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+        flush_delay: float = PERSISTENCE_FLUSH_DELAY
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.flush_delay = flush_delay
+        self.loads = 0
+        self.writes = 0
+        self._loaded: Set[int] = set()
+        self._loading: Dict[int, asyncio.Future] = {}
+        self._written: Dict[int, int] = {}  # Hash of the state last loaded or staged per user
+        self._evicted: Set[int] = set()
+        self._dirty: Dict[int, Optional[str]] = {}  # None marks a row to delete
+        self._lock = threading.Lock()
+        # Held for a whole write, so writes commit in the order they took their snapshots
+        self._write_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def encode(session: UserSession) -> str:
+        return json.dumps(session.to_state(), separators=(',', ':'))
+
+    def _stage(self, user_id: int, text: Optional[str]) -> None:
+        digest = hash(text)
+        if self._written.get(user_id) == digest:
+            return  # Nothing changed since the last write
+        self._written[user_id] = digest
+        with self._lock:
+            self._dirty[user_id] = text
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        await asyncio.get_running_loop().run_in_executor(executor, self.write)
+
+    def write(self) -> int:
+        """Write all staged sessions in one transaction; returns rows written or deleted."""
+        with self._write_lock:
+            return self._write()
+
+    def _write(self) -> int:
+        with self._lock:
+            if not self._dirty:
+                return 0
+            batch, self._dirty = self._dirty, {}
+
+        table = UserState.__table__
+        user_ids = list(batch)
+        now = datetime.utcnow()
+        try:
+            with get_engine().begin() as conn:
+                for i in range(0, len(user_ids), PERSISTENCE_BATCH_SIZE):
+                    chunk = user_ids[i:i + PERSISTENCE_BATCH_SIZE]
+                    conn.execute(delete(table).where(table.c.user_id.in_(chunk)))
+                rows = [
+                    {'user_id': user_id, 'state': text, 'updated_at': now}
+                    for user_id, text in batch.items() if text is not None
+                ]
+                if rows:
+                    conn.execute(insert(table), rows)
+            self.writes += len(batch)
+            return len(batch)
+        except SQLAlchemyError as e:
+            print(f"Error writing user states: {e}")
+            # Retry on the next write unless a newer state was staged meanwhile
+            with self._lock:
+                for user_id, text in batch.items():
+                    self._dirty.setdefault(user_id, text)
+            return 0
+
+    def _load(self, user_id: int) -> Optional[str]:
+        with self._lock:
+            text = self._dirty.get(user_id, _MISSING)
+        if text is not _MISSING:
+            return text  # Staged but not written yet
+        table = UserState.__table__
+        with get_engine().connect() as conn:
+            return conn.execute(select(table.c.state).where(table.c.user_id == user_id)).scalar()
+
+    def evict(self, user_id: int, session: UserSession) -> None:
+        """Stage a session that is about to leave memory, keeping its row for the next update."""
+        if user_id in self._loaded:
+            self._stage(user_id, self.encode(session))
+            self._loaded.discard(user_id)
+        self._written.pop(user_id, None)
+        self._evicted.add(user_id)
+
+    async def get_user_data(self) -> Dict[int, UserSession]:
+        # Sessions are loaded per user in refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: UserSession) -> None:
+        """Load the user's stored session into user_data on their first update."""
+        if user_id in self._loaded:
+            return
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = asyncio.get_running_loop().run_in_executor(executor, self._load, user_id)
+            self._loading[user_id] = loading
+        try:
+            text = await loading
+        except SQLAlchemyError as e:
+            print(f"Error loading user state: {e}")
+            return
+        finally:
+            self._loading.pop(user_id, None)
+
+        if user_id in self._loaded:
+            return  # A concurrent update for this user got here first
+        self._loaded.add(user_id)
+        self._evicted.discard(user_id)
+        self.loads += 1
+        if text is not None:
+            user_data.load_state(json.loads(text))
+            self._written[user_id] = hash(text)
+
+    async def update_user_data(self, user_id: int, data: UserSession) -> None:
+        if user_id not in self._loaded:
+            return  # Evicted or never loaded; the stored row is the newer copy
+        self._stage(user_id, self.encode(data))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._evicted:
+            self._evicted.discard(user_id)
+            return  # Dropped from memory only
+        self._loaded.discard(user_id)
+        self._written.pop(user_id, None)
+        self._stage(user_id, None)
+
+    async def flush(self) -> None:
+        """Write whatever is staged right away; called when the application shuts down."""
+        if self._flush_task is not None:
+            # Only stops a flush that is still waiting; one already on the executor keeps
+            # running, and the final write below queues behind it on the write lock
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await asyncio.get_running_loop().run_in_executor(executor, self.write)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
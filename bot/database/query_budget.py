@@ -0,0 +1,132 @@
+import asyncio
+import sys
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+from .engine import get_engine
+
+# Most statements each DatabaseManager read may issue, whatever the data size.
+# A method that starts looping over rows with lazy loads blows through these.
+QUERY_BUDGETS: Dict[str, int] = {
+    'get_user': 1,
+    'get_user_songs': 1,
+    'get_user_songs_after': 1,
+    'get_user_playlists': 1,
+    'get_playlist_songs': 2,
+    'get_playlist_page': 3,
+    'get_user_queue': 1,
+}
+
+class QueryBudgetExceeded(AssertionError):
+    """A block of code issued more SQL statements than its budget allows."""
+
+class QueryCounter:
+    """Count the SQL statements an engine executes while active, from any thread."""
+
+    def __init__(self, engine=None):
+        self.engine = engine or get_engine()
+        self.statements: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+    def __enter__(self) -> 'QueryCounter':
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
+
+@contextmanager
+def query_budget(budget: int, label: str = 'block', engine=None) -> Iterator[QueryCounter]:
+    """Fail with QueryBudgetExceeded if the block issues more than `budget` statements."""
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count > budget:
+        statements = '\n'.join(f"  {statement}" for statement in counter.statements)
+        raise QueryBudgetExceeded(f"{label} issued {counter.count} statements, budget is {budget}:\n{statements}")
+
+async def assert_query_budget(call: Callable[[], Awaitable], budget: int, label: str = 'call', engine=None):
+    """Await a DatabaseManager call and fail if it issues more than `budget` statements."""
+    with query_budget(budget, label, engine):
+        return await call()
+
+async def check_query_budgets(db, user_id: int, budgets: Optional[Dict[str, int]] = None) -> List[str]:
+    """Run each budgeted read for a user; returns one failure message per method over budget."""
+    failures = []
+    for method, budget in (budgets or QUERY_BUDGETS).items():
+        try:
+            await assert_query_budget(lambda: getattr(db, method)(user_id), budget, method)
+        except QueryBudgetExceeded as e:
+            failures.append(str(e))
+    return failures
+
+# Shape of the user the CLI seeds: enough rows in every relationship that a
+# per-row lazy load shows up as extra statements
+BUDGET_PLAYLISTS = 3
+BUDGET_SONGS = 12
+BUDGET_JOBS = 3
+
+async def seed_budget_user(db, user_id: int = 1) -> int:
+    """Give a user several playlists, songs and download jobs to measure reads against."""
+    await db.create_user(user_id, 'query_budget')
+    song_ids = []
+    for i in range(BUDGET_SONGS):
+        song = await db.add_song(
+            title=f"Budget Song {i}",
+            artist=f"Budget Artist {i % 4}",
+            duration=180 + i,
+            file_id=f"budget_file_{i}",
+            user_id=user_id,
+            source_id=f"budget_{i}"
+        )
+        song_ids.append(song.song_id)
+    # The default playlist holds every song; the others hold overlapping halves
+    await db.add_songs_to_playlist(user_id, song_ids)
+    for i in range(1, BUDGET_PLAYLISTS):
+        playlist = await db.create_playlist(user_id, f"Budget Playlist {i}")
+        await db.add_songs_to_playlist(user_id, song_ids[i::2], playlist.playlist_id)
+    for i in range(BUDGET_JOBS):
+        await db.create_download_job(user_id, user_id, i + 1, {'id': f"budget_job_{i}", 'title': f"Budget Job {i}"})
+    return user_id
+
+async def _check_scratch_database() -> List[str]:
+    import os
+    import tempfile
+    from .engine import create_db_engine, set_engine
+    from .models import init_db
+    from .operations import DatabaseManager, bind_sessions
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    scratch = create_db_engine(f"sqlite:///{path}")
+    previous = set_engine(scratch)
+    bind_sessions(scratch)
+    try:
+        init_db()
+        db = DatabaseManager()
+        return await check_query_budgets(db, await seed_budget_user(db))
+    finally:
+        set_engine(previous)
+        bind_sessions(get_engine())
+        scratch.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+if __name__ == '__main__':
+    # Measured in a scratch database seeded with a populated user, never the live one
+    failures = asyncio.run(_check_scratch_database())
+    for failure in failures:
+        print(failure)
+    print(f"{len(QUERY_BUDGETS) - len(failures)}/{len(QUERY_BUDGETS)} methods within their query budgets")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,191 @@
+import asyncio
+import os
+from collections import deque
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from telegram.helpers import escape_markdown
+
+from bot.database.models import DownloadJobView, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING
+from bot.database.operations import DatabaseManager
+from bot.utils.tracing import tracer
+
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '3'))
+
+def track_source_id(track: dict) -> Optional[str]:
+    """Get the key that identifies a search result's track across users."""
+    source = track.get('id') or track.get('webpage_url') or track.get('url')
+    return str(source) if source else None
+
+class JobMessage:
+    """Stand-in for the job's progress message, edited through the Bot by id."""
+
+    def __init__(self, bot, chat_id: int, message_id: int):
+        self._bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+    async def edit_text(self, text: str, **kwargs):
+        return await self._bot.edit_message_text(
+            text, chat_id=self.chat_id, message_id=self.message_id, **kwargs
+        )
+
+async def edit_status(message, text: str, **kwargs) -> None:
+    """Edit a job's status message; it may be gone, which is no reason to fail the job."""
+    try:
+        await message.edit_text(text, **kwargs)
+    except Exception as e:
+        print(f"Error editing download status: {e}")
+
+class DownloadQueue:
+    """Persistent download queue served by a fixed pool of workers, round-robin across users.
+
+    Jobs are stored in download_jobs before they are scheduled, so the queue
+    survives restarts; jobs left running by a crash start over.
+    """
+
+    def __init__(self, workers: int = DOWNLOAD_WORKERS):
+        self.workers = workers
+        self.db = DatabaseManager()
+        self._pending: Dict[int, Deque[DownloadJobView]] = {}
+        self._users: Deque[int] = deque()  # Users with pending jobs, in turn order
+        self._ready = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self.bot = None
+        self.download: Optional[Callable[[dict], Awaitable[str]]] = None
+        self.on_complete: Optional[Callable[..., Awaitable[bool]]] = None
+
+    async def start(self, bot, download: Callable[[dict], Awaitable[str]], on_complete: Callable[..., Awaitable[bool]]) -> None:
+        """Reload unfinished jobs and start the workers.
+
+        download fetches a track and returns the local audio file path;
+        on_complete(query, track, file_id, context) saves the uploaded song.
+        """
+        self.bot = bot
+        self.download = download
+        self.on_complete = on_complete
+        self._stopping = False
+        for job in await self.db.get_unfinished_download_jobs():
+            self._schedule(job)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running are picked up again on the next start.
+
+        Call it while the bot can still make requests, so running jobs end cleanly.
+        """
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # start() reloads unfinished jobs from the database; keeping these would run them twice
+        self._pending.clear()
+        self._users.clear()
+
+    async def enqueue(self, user_id: int, chat_id: int, message_id: int, track: dict) -> Optional[DownloadJobView]:
+        """Persist a download job and schedule it behind the user's earlier jobs."""
+        job = await self.db.create_download_job(user_id, chat_id, message_id, track)
+        if job is not None:
+            self._schedule(job)
+        return job
+
+    def pending_count(self, user_id: int) -> int:
+        return len(self._pending.get(user_id, ()))
+
+    def _schedule(self, job: DownloadJobView) -> None:
+        jobs = self._pending.get(job.user_id)
+        if jobs is None:
+            jobs = self._pending[job.user_id] = deque()
+            self._users.append(job.user_id)
+        jobs.append(job)
+        self._ready.set()
+
+    async def _next_job(self) -> DownloadJobView:
+        while not self._users:
+            self._ready.clear()
+            await self._ready.wait()
+        
+        # Take one job from the user whose turn it is, then send them to the back
+        user_id = self._users.popleft()
+        jobs = self._pending[user_id]
+        job = jobs.popleft()
+        if jobs:
+            self._users.append(user_id)
+        else:
+            del self._pending[user_id]
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._next_job()
+            with tracer.trace('download_job', job_id=job.job_id, user_id=job.user_id):
+                await self._run(job)
+
+    async def _run(self, job: DownloadJobView) -> None:
+        await self.db.set_download_job_status(job.job_id, JOB_RUNNING)
+        message = JobMessage(self.bot, job.chat_id, job.message_id)
+        query = SimpleNamespace(from_user=SimpleNamespace(id=job.user_id), message=message)
+        track = job.track
+        await edit_status(
+            message,
+            "⬇️ *Downloading...*\n\n"
+            f"{escape_markdown(track['title'])}\n"
+            "───────────────────",
+            parse_mode='Markdown'
+        )
+        try:
+            # Another user may have fetched this track since the job was queued
+            file_id = await self.db.get_file_id_by_source(track_source_id(track))
+            if file_id:
+                await self.bot.send_audio(
+                    job.chat_id,
+                    audio=file_id,
+                    title=track['title'],
+                    performer=track.get('uploader'),
+                    duration=track.get('duration')
+                )
+            else:
+                with tracer.span('downloader.download_music'):
+                    path = await self.download(track)
+                try:
+                    with open(path, 'rb') as audio:
+                        sent = await self.bot.send_audio(
+                            job.chat_id,
+                            audio=audio,
+                            title=track['title'],
+                            performer=track.get('uploader'),
+                            duration=track.get('duration')
+                        )
+                finally:
+                    # Telegram keeps the upload; the file_id is all that is reused
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"Error removing downloaded file {path}: {e}")
+                file_id = sent.audio.file_id
+            saved = await self.on_complete(query, track, file_id, None)
+            await self.db.set_download_job_status(job.job_id, JOB_DONE if saved else JOB_FAILED)
+        except asyncio.CancelledError:
+            # Stopped mid-job; hand it back so the next start runs it again
+            await self.db.set_download_job_status(job.job_id, JOB_PENDING)
+            raise
+        except Exception as e:
+            if self._stopping:
+                # The bot went away underneath the job, which is no fault of the job's
+                print(f"Download job {job.job_id} interrupted by shutdown: {e}")
+                await self.db.set_download_job_status(job.job_id, JOB_PENDING)
+                return
+            print(f"Error running download job {job.job_id}: {e}")
+            await self.db.set_download_job_status(job.job_id, JOB_FAILED, error=str(e))
+            await edit_status(
+                message,
+                "❌ *Error*\n\n"
+                "Download failed. Please try again.\n"
+                "───────────────────",
+                parse_mode='Markdown'
+            )
+
+download_queue = DownloadQueue()
@@ -1,9 +1,14 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
+from telegram.helpers import escape_markdown
 from typing import List, Dict
 
 from bot.database.operations import DatabaseManager
+from bot.search.sessions import search_sessions
+from bot.utils.cleanup import message_cleaner
+from bot.utils.metrics import instrument_handler
+from bot.utils.session_store import MessageRef
 from services.music_download import MusicDownloader
 from config import MAX_PLAYLIST_SIZE
 
@@ -19,6 +24,13 @@ COMMANDS = {
     'queue': 'View your download queue'
 }
 
+QUEUE_STATUS_ICONS = {
+    'pending': "⏳",
+    'running': "⬇️",
+    'done': "✅",
+    'failed': "❌"
+}
+
 def create_main_menu() -> InlineKeyboardMarkup:
     """Create the main menu keyboard."""
     # Your deployed Netlify URL
@@ -36,15 +48,13 @@ async def setup_commands(application) -> None:
     commands = [BotCommand(command, description) for command, description in COMMANDS.items()]
     await application.bot.set_my_commands(commands)
 
+@instrument_handler('start_command')
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /start command."""
+    # A search still pending would otherwise edit a message this command replaces
+    search_sessions.cancel(update.effective_user.id)
     # Clean up previous messages
-    if 'last_bot_messages' in context.user_data:
-        for msg in context.user_data['last_bot_messages']:
-            try:
-                await msg.delete()
-            except:
-                pass
+    message_cleaner.schedule(context.bot, context.user_data.last_bot_messages)
     
     msg = await update.message.reply_text(
         "⚡ *Welcome to LightBolt!*\n\n"
@@ -58,10 +68,12 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
     
     # Store message for cleanup
-    context.user_data['last_bot_messages'] = [msg]
+    context.user_data.last_bot_messages = (MessageRef.of(msg),)
 
+@instrument_handler('help_command')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /help command."""
+    search_sessions.cancel(update.effective_user.id)
     help_text = "*Available Commands:*\n\n"
     for command, description in COMMANDS.items():
         help_text += f"/{command} - {description}\n"
@@ -76,18 +88,15 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         parse_mode='Markdown'
     )
     
-    if 'last_bot_messages' in context.user_data:
-        try:
-            for old_msg in context.user_data['last_bot_messages']:
-                await old_msg.delete()
-        except:
-            pass
-    context.user_data['last_bot_messages'] = [msg]
+    message_cleaner.schedule(context.bot, context.user_data.last_bot_messages)
+    context.user_data.last_bot_messages = (MessageRef.of(msg),)
 
+@instrument_handler('playlist_command')
 async def playlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /playlist command."""
+    search_sessions.cancel(update.effective_user.id)
     user_id = update.effective_user.id
-    playlists = db.get_user_playlists(user_id)
+    playlists = await db.get_user_playlists(user_id)
     
     if not playlists:
         msg = await update.message.reply_text(
@@ -101,36 +110,34 @@ async def playlist_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             parse_mode='Markdown'
         )
     else:
+        # Text and buttons both come from the one grouped listing query
         playlist_text = "*📱 My Playlists*\n\n"
-        for playlist in playlists:
-            song_count = db.get_playlist_song_count(playlist['id'])
-            playlist_text += f"• {playlist['name']} ({song_count} songs)\n"
-        
-        playlist_text += "\nSelect a playlist to view its songs"
-        
         keyboard = []
         for playlist in playlists:
+            duration = f"{playlist.total_duration // 60}:{playlist.total_duration % 60:02d}"
+            details = f"({playlist.song_count} songs, {duration})"
+            # Names are the user's own text; button labels aren't parsed, the message is
+            playlist_text += f"• {escape_markdown(playlist.name)} {details}\n"
             keyboard.append([InlineKeyboardButton(
-                f"{playlist['name']} ({db.get_playlist_song_count(playlist['id'])} songs)",
-                callback_data=f"view_playlist_{playlist['id']}"
+                f"{playlist.name} {details}",
+                callback_data=f"view_playlist_{playlist.playlist_id}"
             )])
         
+        playlist_text += "\nSelect a playlist to view its songs"
+        
         msg = await update.message.reply_text(
             playlist_text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
     
-    if 'last_bot_messages' in context.user_data:
-        try:
-            for old_msg in context.user_data['last_bot_messages']:
-                await old_msg.delete()
-        except:
-            pass
-    context.user_data['last_bot_messages'] = [msg]
+    message_cleaner.schedule(context.bot, context.user_data.last_bot_messages)
+    context.user_data.last_bot_messages = (MessageRef.of(msg),)
 
+@instrument_handler('search_command')
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /search command."""
+    search_sessions.cancel(update.effective_user.id)
     msg = await update.message.reply_text(
         "*🔍 Music Search*\n\n"
         "Send me a song name or artist...\n\n"
@@ -141,19 +148,17 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         parse_mode='Markdown'
     )
     
-    if 'last_bot_messages' in context.user_data:
-        try:
-            for old_msg in context.user_data['last_bot_messages']:
-                await old_msg.delete()
-        except:
-            pass
-    context.user_data['last_bot_messages'] = [msg]
-    context.user_data['expecting_search'] = True
+    message_cleaner.schedule(context.bot, context.user_data.last_bot_messages)
+    context.user_data.last_bot_messages = (MessageRef.of(msg),)
+    context.user_data.last_bot_message = MessageRef.of(msg)
+    context.user_data.expecting_search = True
 
+@instrument_handler('queue_command')
 async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /queue command."""
+    search_sessions.cancel(update.effective_user.id)
     user_id = update.effective_user.id
-    queue = db.get_user_queue(user_id)
+    queue = await db.get_user_queue(user_id)
     
     if not queue:
         msg = await update.message.reply_text(
@@ -168,18 +173,13 @@ async def queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     else:
         queue_text = "*⏳ Download Queue*\n\n"
         for i, item in enumerate(queue, 1):
-            status = "⏳" if item['status'] == 'pending' else "✅"
-            queue_text += f"{i}. {status} {item['song_name']}\n"
+            status = QUEUE_STATUS_ICONS.get(item['status'], "⏳")
+            queue_text += f"{i}. {status} {escape_markdown(item['song_name'])}\n"
         
         msg = await update.message.reply_text(
             queue_text,
             parse_mode='Markdown'
         )
     
-    if 'last_bot_messages' in context.user_data:
-        try:
-            for old_msg in context.user_data['last_bot_messages']:
-                await old_msg.delete()
-        except:
-            pass
-    context.user_data['last_bot_messages'] = [msg] 
\ No newline at end of file
+    message_cleaner.schedule(context.bot, context.user_data.last_bot_messages)
+    context.user_data.last_bot_messages = (MessageRef.of(msg),)
\ No newline at end of file
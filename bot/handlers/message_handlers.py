@@ -1,14 +1,24 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
+from telegram.helpers import escape_markdown
 import asyncio
 
 from bot.database.operations import DatabaseManager
 from services.music_download import MusicDownloader
+from bot.search.cache import SearchCache
+from bot.search.sessions import search_sessions
+from bot.utils.cleanup import message_cleaner
+from bot.utils.metrics import callback_route, instrument_handler, registry
+from bot.utils.session_store import MessageRef, SearchResult
+from bot.downloads.queue import download_queue, edit_status, track_source_id
 from .command_handlers import create_main_menu
+from .playlist_view import show_playlist_page
 
 db = DatabaseManager()
 downloader = MusicDownloader()
+search_cache = SearchCache(downloader.search_music)
+registry.add_collector(search_cache.samples)
 
 async def delete_message_with_delay(message, delay: int = 2):
     """Delete message after delay."""
@@ -32,6 +42,21 @@ def create_search_results_keyboard(results):
     keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
     return InlineKeyboardMarkup(keyboard)
 
+def create_library_results_keyboard(songs):
+    """Create keyboard for matches already in the user's library."""
+    keyboard = []
+    for song in songs:
+        duration = f"{song.duration // 60}:{song.duration % 60:02d}"
+        keyboard.append([
+            InlineKeyboardButton(
+                f"🎵 {song.title} ({duration})",
+                callback_data=f"p_play_{song.song_id}"
+            )
+        ])
+    keyboard.append([InlineKeyboardButton("🌐 Search Online", callback_data="search_online")])
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
 def create_main_menu():
     """Create the main menu keyboard."""
     keyboard = [
@@ -42,36 +67,86 @@ def create_main_menu():
 
 async def cleanup_messages(context):
     """Clean up old messages before sending new ones."""
-    # Clean up previous audio message if it exists
-    if 'last_audio_message' in context.user_data:
-        try:
-            await context.user_data['last_audio_message'].delete()
-        except Exception as e:
-            if "Message to delete not found" not in str(e):
-                print(f"Error deleting audio message: {e}")
-        finally:
-            del context.user_data['last_audio_message']
-    
-    # Clean up previous bot messages
-    if 'last_bot_messages' in context.user_data:
-        for msg in context.user_data['last_bot_messages']:
-            try:
-                await msg.delete()
-            except Exception as e:
-                if "Message to delete not found" not in str(e):
-                    print(f"Error deleting message: {e}")
-        context.user_data['last_bot_messages'] = []
-    
-    # Clean up user's last message
-    if 'last_user_message' in context.user_data:
+    # Deletions run in the background so the reply isn't held up by them
+    session = context.user_data
+    stale = session.last_bot_messages + (session.last_audio_message, session.last_user_message)
+    session.last_bot_messages = ()
+    session.last_audio_message = None
+    session.last_user_message = None
+    message_cleaner.schedule(context.bot, stale)
+
+async def run_search(context, user_id: int, text: str, library: bool = True) -> None:
+    """Search for tracks and show the results in the user's bot message.
+
+    Matches already in the user's library are offered first, in place of the remote search.
+    """
+    bot_message = context.user_data.last_bot_message
+    try:
+        if library:
+            songs = await db.search_library(user_id, text)
+            if songs:
+                await bot_message.edit_text(
+                    context.bot,
+                    "📚 *Already in Your Library*\n\n"
+                    "Tap a song to play it:\n"
+                    "───────────────────",
+                    reply_markup=create_library_results_keyboard(songs),
+                    parse_mode='Markdown'
+                )
+                return
+        
+        # Update to searching status
+        await bot_message.edit_text(
+            context.bot,
+            "⚡ *Searching...*\n"
+            "───────────────────",
+            parse_mode='Markdown'
+        )
+        
+        # Search for tracks
+        results = await search_cache.search(text)
+        if not results:
+            await bot_message.edit_text(
+                context.bot,
+                "❌ *No Results*\n\n"
+                "Try a different search term.\n"
+                "───────────────────",
+                reply_markup=create_main_menu(),
+                parse_mode='Markdown'
+            )
+            return
+            
+        # Keep only the fields needed once a result is picked
+        context.user_data.search_results = tuple(SearchResult.from_track(track) for track in results[:5])
+        # This runs after the update was handled, whose persistence mark is already spent
+        context.application.mark_data_for_update_persistence(user_ids=[user_id])
+        
+        # Show results by editing the bot message
+        await bot_message.edit_text(
+            context.bot,
+            "⚡ *Search Results*\n\n"
+            "Select a song to download:\n"
+            "───────────────────",
+            reply_markup=create_search_results_keyboard(results),
+            parse_mode='Markdown'
+        )
+        
+    except Exception as e:
+        print(f"Error searching: {e}")
         try:
-            await context.user_data['last_user_message'].delete()
+            await bot_message.edit_text(
+                context.bot,
+                "❌ *Error*\n\n"
+                "Search failed. Please try again.\n"
+                "───────────────────",
+                reply_markup=create_main_menu(),
+                parse_mode='Markdown'
+            )
         except Exception as e:
-            if "Message to delete not found" not in str(e):
-                print(f"Error deleting user message: {e}")
-        finally:
-            del context.user_data['last_user_message']
+            # Nothing awaits this task, so an error here would go unreported
+            print(f"Error reporting failed search: {e}")
 
+@instrument_handler('handle_message')
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle text messages."""
     message = update.message
@@ -83,70 +158,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return  # Ignore commands
 
     # Immediately delete user's message
-    try:
-        await message.delete()
-    except:
-        pass
+    message_cleaner.schedule(context.bot, [message])
         
     # Store the search query in context
-    context.user_data['search_query'] = text
+    context.user_data.search_query = text
     
     # Edit the existing bot message
-    if 'last_bot_message' in context.user_data:
-        try:
-            # Update to searching status
-            await context.user_data['last_bot_message'].edit_text(
-                "⚡ *Searching...*\n"
-                "───────────────────",
-                parse_mode='Markdown'
-            )
-            
-            # Search for tracks
-            results = await downloader.search_music(text)
-            if not results:
-                await context.user_data['last_bot_message'].edit_text(
-                    "❌ *No Results*\n\n"
-                    "Try a different search term.\n"
-                    "───────────────────",
-                    reply_markup=create_main_menu(),
-                    parse_mode='Markdown'
-                )
-                return
-                
-            # Store results in context
-            context.user_data['search_results'] = results
-            
-            # Create keyboard with results
-            keyboard = []
-            for i, track in enumerate(results[:5]):  # Limit to 5 results
-                duration = f"{track['duration'] // 60}:{track['duration'] % 60:02d}"
-                keyboard.append([
-                    InlineKeyboardButton(
-                        f"🎵 {track['title']} ({duration})",
-                        callback_data=f"download_{i}"
-                    )
-                ])
-            
-            keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
-            
-            # Show results by editing the bot message
-            await context.user_data['last_bot_message'].edit_text(
-                "⚡ *Search Results*\n\n"
-                "Select a song to download:\n"
-                "───────────────────",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-            
-        except Exception as e:
-            print(f"Error searching: {e}")
-            await context.user_data['last_bot_message'].edit_text(
-                "❌ *Error*\n\n"
-                "Search failed. Please try again.\n"
-                "───────────────────",
-                reply_markup=create_main_menu(),
-                parse_mode='Markdown'
-            )
+    if context.user_data.last_bot_message is not None:
+        # Run in the background; a newer query from this user supersedes this one
+        search_sessions.submit(user_id, run_search(context, user_id, text))
     else:
         # If somehow there's no bot message, redirect user to use /search command
         try:
@@ -158,68 +178,33 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         except:
             pass
 
+@instrument_handler('handle_callback', route=lambda update: callback_route(update.callback_query.data))
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle callback queries."""
     query = update.callback_query
     user_id = query.from_user.id
+    # Any button press moves on from a search still waiting to edit the bot message
+    search_sessions.cancel(user_id)
     
     try:
         # Clean up only audio message when navigating away
         if query.data in ["main_menu", "search", "playlist"] or query.data.startswith("view_playlist"):
-            if 'last_audio_message' in context.user_data:
-                try:
-                    await context.user_data['last_audio_message'].delete()
-                except Exception as e:
-                    if "Message to delete not found" not in str(e):
-                        print(f"Error deleting audio message: {e}")
-                finally:
-                    del context.user_data['last_audio_message']
+            message_cleaner.schedule(context.bot, [context.user_data.last_audio_message])
+            context.user_data.last_audio_message = None
 
         # Handle song deletion from playlist
         if query.data.startswith("p_del_"):
             try:
-                _, _, song_id = query.data.split("_")
-                if db.remove_song_from_playlist(user_id, int(song_id)):
-                    # Show updated playlist
-                    songs = db.get_playlist_songs(user_id)
-                    
-                    if not songs:
-                        keyboard = [
-                            [InlineKeyboardButton("��� Back", callback_data="main_menu")]
-                        ]
-                        await query.message.edit_text(
-                            "⚡ *Empty Playlist*\n\n"
-                            "Your playlist is empty.\n"
-                            "───────────────────",
-                            reply_markup=InlineKeyboardMarkup(keyboard),
-                            parse_mode='Markdown'
-                        )
-                    else:
-                        text = "⚡ *My Music*\n\n"
-                        keyboard = []
-                        
-                        for i, song in enumerate(songs, 1):
-                            duration = f"{song.duration // 60}:{song.duration % 60:02d}"
-                            text += f"{i}. {song.title} - {song.artist} ({duration})\n"
-                            keyboard.append([
-                                InlineKeyboardButton(
-                                    f"▶️ Play #{i}",
-                                    callback_data=f"p_play_{song.song_id}"
-                                ),
-                                InlineKeyboardButton(
-                                    "🗑️ Delete",
-                                    callback_data=f"p_del_{song.song_id}"
-                                )
-                            ])
-                        
-                        text += "\n───────────────────"
-                        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
-                        
-                        await query.message.edit_text(
-                            text,
-                            reply_markup=InlineKeyboardMarkup(keyboard),
-                            parse_mode='Markdown'
-                        )
+                _, _, song_id, playlist_id, page_number, anchor = query.data.split("_")
+                if await db.remove_song_from_playlist(user_id, int(song_id), int(playlist_id)):
+                    # Show the same page of the updated playlist
+                    await show_playlist_page(
+                        query,
+                        user_id,
+                        page_number=int(page_number),
+                        after_key=int(anchor) or None,
+                        playlist_id=int(playlist_id)
+                    )
                     await query.answer("✅ Song removed from playlist")
                 else:
                     await query.answer("❌ Could not remove song", show_alert=True)
@@ -228,20 +213,34 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 await query.answer("❌ Could not remove song", show_alert=True)
             return
 
+        elif query.data.startswith("pl_page_") or query.data.startswith("pl_prev_"):
+            _, direction, playlist_id, page_number, key = query.data.split("_")
+            if direction == "page":
+                await show_playlist_page(
+                    query, user_id, page_number=int(page_number), after_key=int(key), playlist_id=int(playlist_id)
+                )
+            else:
+                await show_playlist_page(
+                    query, user_id, page_number=int(page_number), before_key=int(key), playlist_id=int(playlist_id)
+                )
+            await query.answer()
+            return
+
+        elif query.data.startswith("view_playlist_"):
+            # Scoped to the owner, so someone else's playlist id shows as empty
+            playlist_id = int(query.data.split("_")[2])
+            await show_playlist_page(query, user_id, playlist_id=playlist_id)
+            await query.answer()
+            return
+
         elif query.data.startswith("p_play_"):
             try:
                 # Clean up previous audio before playing new one
-                if 'last_audio_message' in context.user_data:
-                    try:
-                        await context.user_data['last_audio_message'].delete()
-                    except Exception as e:
-                        if "Message to delete not found" not in str(e):
-                            print(f"Error deleting audio message: {e}")
-                    finally:
-                        del context.user_data['last_audio_message']
+                message_cleaner.schedule(context.bot, [context.user_data.last_audio_message])
+                context.user_data.last_audio_message = None
                 
                 song_id = query.data.split("_")[2]
-                song = db.get_song_by_id(int(song_id))
+                song = await db.get_song_by_id(int(song_id))
                 if song:
                     sent_message = await query.message.reply_audio(
                         audio=song.file_id,
@@ -251,7 +250,9 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                         caption=f"⚡ *Now Playing:*\n{song.title} - {song.artist}",
                         parse_mode='Markdown'
                     )
-                    context.user_data['last_audio_message'] = sent_message
+                    context.user_data.last_audio_message = MessageRef.of(sent_message)
+                    # Buffered in memory; download_counter writes plays back in batches
+                    await db.increment_download_count(song.song_id)
                 else:
                     await query.answer("❌ Song not found", show_alert=True)
             except Exception as e:
@@ -260,44 +261,59 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             return
 
         elif query.data == "playlist":
-            songs = db.get_playlist_songs(user_id)
-            if not songs:
-                keyboard = [
-                    [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-                ]
-                await query.message.edit_text(
-                    "⚡ *Empty Playlist*\n\n"
-                    "Your playlist is empty.\n"
-                    "───────────────────",
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown'
-                )
-            else:
-                text = "⚡ *My Music*\n\n"
-                keyboard = []
-                
-                for i, song in enumerate(songs, 1):
-                    duration = f"{song.duration // 60}:{song.duration % 60:02d}"
-                    text += f"{i}. {song.title} - {song.artist} ({duration})\n"
-                    keyboard.append([
-                        InlineKeyboardButton(
-                            f"▶️ Play #{i}",
-                            callback_data=f"p_play_{song.song_id}"
-                        ),
-                        InlineKeyboardButton(
-                            "🗑️ Delete",
-                            callback_data=f"p_del_{song.song_id}"
-                        )
-                    ])
-                
-                text += "\n───────────────"
-                keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
-                
-                await query.message.edit_text(
-                    text,
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                    parse_mode='Markdown'
-                )
+            await show_playlist_page(query, user_id)
+            return
+
+        elif query.data.startswith("download_"):
+            index = int(query.data.split("_")[1])
+            results = context.user_data.search_results
+            if index >= len(results):
+                await query.answer("❌ Search expired, please search again", show_alert=True)
+                return
+            
+            track = results[index].to_track()
+            
+            # A track someone already downloaded is sent straight from Telegram's copy
+            file_id = await db.get_file_id_by_source(track_source_id(track))
+            if file_id:
+                message_cleaner.schedule(context.bot, [context.user_data.last_audio_message])
+                context.user_data.last_audio_message = MessageRef.of(await query.message.reply_audio(
+                    audio=file_id,
+                    title=track['title'],
+                    performer=track.get('uploader'),
+                    duration=track.get('duration')
+                ))
+                await handle_download_completion(query, track, file_id, context)
+                await query.answer()
+                return
+            
+            job = await download_queue.enqueue(
+                user_id, query.message.chat_id, query.message.message_id, track
+            )
+            if not job:
+                await query.answer("❌ Could not queue download", show_alert=True)
+                return
+            
+            ahead = download_queue.pending_count(user_id) - 1
+            await query.message.edit_text(
+                "⏳ *Queued*\n\n"
+                f"{escape_markdown(track['title'])}\n"
+                + (f"{ahead} of your downloads ahead\n" if ahead > 0 else "")
+                + "───────────────────",
+                parse_mode='Markdown'
+            )
+            await query.answer()
+            return
+
+        elif query.data == "search_online":
+            # The user saw their library matches and still wants the remote results
+            text = context.user_data.search_query
+            if not text:
+                await query.answer("❌ Search expired, please search again", show_alert=True)
+                return
+            context.user_data.last_bot_message = MessageRef.of(query.message)
+            search_sessions.submit(user_id, run_search(context, user_id, text, library=False))
+            await query.answer()
             return
 
         elif query.data == "search":
@@ -311,6 +327,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 ]]),
                 parse_mode='Markdown'
             )
+            context.user_data.last_bot_message = MessageRef.of(query.message)
             return
             
         elif query.data == "main_menu":
@@ -335,59 +352,63 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 reply_markup=create_main_menu(),
                 parse_mode='Markdown'
             )
-            context.user_data['last_bot_messages'] = [msg]
+            context.user_data.last_bot_messages = (MessageRef.of(msg),)
         except:
             pass
 
-async def handle_download_completion(query, track, file_id, context):
-    """Handle the completion of a download."""
+async def handle_download_completion(query, track, file_id, context) -> bool:
+    """Handle the completion of a download; returns whether the song was saved."""
     try:
         # Save song to database with user_id
-        song = db.add_song(
+        song = await db.add_song(
             title=track['title'],
             artist=track['uploader'],
             duration=track['duration'],
             file_id=file_id,
             user_id=query.from_user.id,
-            download_count=1
+            download_count=1,
+            source_id=track_source_id(track)
         )
         
         if not song:
             raise Exception("Could not save song to database")
         
         # Add song to user's playlist automatically
-        if db.add_song_to_playlist(query.from_user.id, song.song_id):
-            await query.message.edit_text(
-                "⚡ *Success!*\n\n"
-                f"Added *{track['title']}* to your playlist\n"
-                "───────────────────",
-                reply_markup=create_main_menu(),
-                parse_mode='Markdown'
-            )
-        else:
+        if not await db.add_song_to_playlist(query.from_user.id, song.song_id):
             raise Exception("Could not add song to playlist")
-        
+        saved = True
     except Exception as e:
         print(f"Error in download completion: {e}")
-        await query.message.edit_text(
+        saved = False
+    
+    # Whether the song was saved is settled; the message is only told about it
+    if saved:
+        await edit_status(
+            query.message,
+            "⚡ *Success!*\n\n"
+            # Legacy Markdown can't escape inside an entity, so the title stays out of the bold
+            f"Added {escape_markdown(track['title'])} to your playlist\n"
+            "───────────────────",
+            reply_markup=create_main_menu(),
+            parse_mode='Markdown'
+        )
+    else:
+        await edit_status(
+            query.message,
             "❌ *Error*\n\n"
             "Could not save song.\n"
             "───────────────────",
             reply_markup=create_main_menu(),
             parse_mode='Markdown'
         )
+    return saved
 
 async def show_playlist_selection(message, track, context):
     """Show playlist selection for adding downloaded song."""
     # Clean up previous messages
-    if 'last_bot_messages' in context.user_data:
-        for msg in context.user_data['last_bot_messages']:
-            try:
-                await msg.delete()
-            except:
-                pass
+    message_cleaner.schedule(context.bot, context.user_data.last_bot_messages)
     
-    playlists = db.get_user_playlists(message.chat.id)
+    playlists = await db.get_user_playlists(message.chat.id)
     keyboard = []
     
     if playlists:
@@ -409,4 +430,4 @@ async def show_playlist_selection(message, track, context):
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     )
-    context.user_data['last_bot_messages'] = [msg] 
\ No newline at end of file
+    context.user_data.last_bot_messages = (MessageRef.of(msg),)
\ No newline at end of file
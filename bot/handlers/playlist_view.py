@@ -0,0 +1,147 @@
+import os
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+from typing import Optional, Tuple
+
+from bot.database.models import PlaylistPage
+from bot.database.operations import DatabaseManager, DEFAULT_PLAYLIST_NAME, PLAYLIST_PAGE_SIZE
+
+db = DatabaseManager()
+
+PLAYLIST_RENDER_CACHE_SIZE = int(os.getenv('PLAYLIST_RENDER_CACHE_SIZE', '2048'))
+
+class PlaylistRenderCache:
+    """LRU of rendered playlist pages keyed by user, playlist version, playlist and page anchor.
+
+    A page is only rendered again once DatabaseManager bumps the playlist
+    version, so repeated views of an unchanged playlist skip both the query
+    and the render.
+    """
+
+    def __init__(self, max_size: int = PLAYLIST_RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+render_cache = PlaylistRenderCache()
+
+def render_playlist_page(page: PlaylistPage, page_number: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Build the text and keyboard for one page of a playlist."""
+    if not page.songs:
+        keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
+        return (
+            "⚡ *Empty Playlist*\n\n"
+            "Your playlist is empty.\n"
+            "───────────────────",
+            InlineKeyboardMarkup(keyboard)
+        )
+    
+    # Every button carries the playlist, and delete its page anchor, so the same page can be redrawn
+    playlist_id = page.playlist_id
+    anchor = page.after_key or 0
+    first_number = (page_number - 1) * PLAYLIST_PAGE_SIZE + 1
+    lines = []
+    keyboard = []
+    for i, song in enumerate(page.songs, first_number):
+        duration = f"{song.duration // 60}:{song.duration % 60:02d}"
+        lines.append(f"{i}. {escape_markdown(song.title or '')} - {escape_markdown(song.artist or '')} ({duration})")
+        keyboard.append([
+            InlineKeyboardButton(
+                f"▶️ Play #{i}",
+                callback_data=f"p_play_{song.song_id}"
+            ),
+            InlineKeyboardButton(
+                "🗑️ Delete",
+                callback_data=f"p_del_{song.song_id}_{playlist_id}_{page_number}_{anchor}"
+            )
+        ])
+    
+    navigation = []
+    if page.after_key is not None:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Previous",
+            callback_data=f"pl_prev_{playlist_id}_{page_number - 1}_{page.songs[0].song_id}"
+        ))
+    if page.next_key is not None:
+        navigation.append(InlineKeyboardButton(
+            "Next ➡️",
+            callback_data=f"pl_page_{playlist_id}_{page_number + 1}_{page.next_key}"
+        ))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
+    
+    # Names and titles are other people's text, so Markdown in them must not be parsed;
+    # legacy Markdown can't escape inside an entity, so the name isn't bold
+    title = f"⚡ {escape_markdown(page.name or DEFAULT_PLAYLIST_NAME)}"
+    if page_number > 1 or page.next_key is not None:
+        title += f" · page {page_number}"
+    text = title + "\n\n" + "\n".join(lines) + "\n\n───────────────────"
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def render_playlist(
+    user_id: int,
+    page_number: int = 1,
+    after_key: Optional[int] = None,
+    before_key: Optional[int] = None,
+    playlist_id: Optional[int] = None
+) -> Tuple[str, InlineKeyboardMarkup]:
+    """Get the text and keyboard for a playlist page, from the render cache when unchanged.
+
+    Without a playlist_id the user's default playlist is shown.
+    """
+    key = (user_id, db.get_playlist_version(user_id), playlist_id, page_number, after_key, before_key)
+    cached = render_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    page = await db.get_playlist_page(
+        user_id, after_key=after_key, before_key=before_key, playlist_id=playlist_id
+    )
+    if not page.songs and page_number > 1:
+        # The page emptied under us; fall back to the start of the playlist
+        page_number = 1
+        page = await db.get_playlist_page(user_id, playlist_id=playlist_id)
+    elif page.after_key is None:
+        # Keyset lookups fall back to the first page when their anchor is gone
+        page_number = 1
+    
+    rendered = render_playlist_page(page, page_number)
+    render_cache.put(key, rendered)
+    return rendered
+
+async def show_playlist_page(
+    query,
+    user_id: int,
+    page_number: int = 1,
+    after_key: Optional[int] = None,
+    before_key: Optional[int] = None,
+    playlist_id: Optional[int] = None
+) -> None:
+    """Show one page of a user's playlist, their default one unless given, in the callback's message."""
+    text, reply_markup = await render_playlist(user_id, page_number, after_key, before_key, playlist_id)
+    await query.message.edit_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
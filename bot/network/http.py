@@ -0,0 +1,100 @@
+import asyncio
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+class HTTPRequest(NamedTuple):
+    method: str
+    path: str
+    headers: Dict[str, str]  # Lower-cased names
+    body: bytes
+
+class HTTPResponse(NamedTuple):
+    status: int
+    body: bytes = b''
+    content_type: str = 'application/json'
+
+Handler = Callable[[HTTPRequest], Awaitable[HTTPResponse]]
+
+class HTTPServer:
+    """Minimal asyncio HTTP/1.1 server with keep-alive, enough for local endpoints."""
+
+    def __init__(self, handler: Handler, host: str = '127.0.0.1', port: int = 0):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        # Report the real port when an ephemeral one was requested
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop accepting connections and close the open ones."""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections.add(writer)
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                try:
+                    response = await self.handler(request)
+                except Exception as e:
+                    print(f"Error handling {request.method} {request.path}: {e}")
+                    response = HTTPResponse(HTTPStatus.INTERNAL_SERVER_ERROR)
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                _write_response(writer, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[HTTPRequest]:
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    if len(head) > MAX_HEADER_BYTES:
+        raise ValueError("Request header too large")
+    
+    lines = head.decode('latin-1').split('\r\n')
+    method, path, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    
+    length = int(headers.get('content-length', '0'))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return HTTPRequest(method, path, headers, body)
+
+def _write_response(writer: asyncio.StreamWriter, response: HTTPResponse, keep_alive: bool) -> None:
+    status = HTTPStatus(response.status)
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {response.content_type}\r\n"
+        f"Content-Length: {len(response.body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode('latin-1') + response.body)
@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+from typing import Dict, List, Optional, Tuple
+
+from bot.utils.metrics import telegram_api_errors, telegram_api_seconds
+from bot.utils.tracing import tracer
+
+# Priority classes, lower goes first
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_GLOBAL_BURST = float(os.getenv('OUTBOUND_GLOBAL_BURST', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+OUTBOUND_POOL_SIZE = int(os.getenv('OUTBOUND_POOL_SIZE', '256'))
+
+# Replies the user is waiting on go first, cleanup last
+METHOD_PRIORITIES = {
+    'answerCallbackQuery': INTERACTIVE,
+    'editMessageText': INTERACTIVE,
+    'editMessageReplyMarkup': INTERACTIVE,
+    'editMessageCaption': INTERACTIVE,
+    'editMessageMedia': INTERACTIVE,
+    'sendChatAction': INTERACTIVE,
+    'deleteMessage': BACKGROUND,
+    'deleteMessages': BACKGROUND,
+}
+
+# Calls that must never wait behind chat traffic
+UNSCHEDULED_METHODS = {
+    'getUpdates', 'getMe', 'getWebhookInfo', 'setWebhook', 'deleteWebhook', 'close', 'logOut',
+}
+
+# Set inside a block of bulk sends to push them behind interactive traffic
+outbound_priority: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    'outbound_priority', default=None
+)
+
+@contextmanager
+def priority(level: int):
+    """Send every Bot API call made inside the block at the given priority."""
+    token = outbound_priority.set(level)
+    try:
+        yield
+    finally:
+        outbound_priority.reset(token)
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token can be taken."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the next `seconds`, as asked by a retry_after."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+class OutboundScheduler:
+    """Grant send slots by priority under a global and a per-chat token bucket."""
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        global_burst: float = OUTBOUND_GLOBAL_BURST,
+        chat_rate: float = OUTBOUND_CHAT_RATE,
+        chat_burst: float = OUTBOUND_CHAT_BURST
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._waiting: List[Tuple[int, int, Optional[int], asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                self._prune(time.monotonic())
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        # A full bucket is indistinguishable from a new one, so it can go
+        for chat_id in [c for c, b in self._chat_buckets.items() if b.is_idle(now)]:
+            del self._chat_buckets[chat_id]
+
+    async def acquire(self, level: int, chat_id: Optional[int] = None) -> None:
+        """Wait until a request of this priority may be sent to this chat."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (level, next(self._sequence), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    def pause(self, chat_id: Optional[int], seconds: float) -> None:
+        """Back off after a retry_after; chatless calls pause all traffic."""
+        if chat_id is None:
+            self.global_bucket.pause(seconds)
+        else:
+            self._chat_bucket(chat_id).pause(seconds)
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._waiting = [entry for entry in self._waiting if not entry[3].done()]
+            heapq.heapify(self._waiting)
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            now = time.monotonic()
+            wait = self.global_bucket.delay(now)
+            if wait == 0:
+                wait = None
+                # Highest priority first; a chat over its own limit doesn't block other chats
+                for entry in sorted(self._waiting):
+                    chat_id = entry[2]
+                    chat_wait = self._chat_bucket(chat_id).delay(now) if chat_id is not None else 0.0
+                    if chat_wait == 0:
+                        self.global_bucket.take(now)
+                        if chat_id is not None:
+                            self._chat_bucket(chat_id).take(now)
+                        self._waiting.remove(entry)
+                        entry[3].set_result(None)
+                        wait = 0.0
+                        break
+                    wait = chat_wait if wait is None else min(wait, chat_wait)
+            
+            if wait:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+class ScheduledRequest(BaseRequest):
+    """Bot API request backend that paces calls through an OutboundScheduler.
+
+    Rate-limit responses are absorbed here: the chat (or everything, for
+    chatless calls) is paused for retry_after and the call is sent again,
+    so handlers don't see RetryAfter unless the retries run out.
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[OutboundScheduler] = None,
+        request: Optional[BaseRequest] = None,
+        max_retries: int = OUTBOUND_MAX_RETRIES
+    ):
+        self.scheduler = scheduler or OutboundScheduler()
+        self._request = request or HTTPXRequest(connection_pool_size=OUTBOUND_POOL_SIZE)
+        self.max_retries = max_retries
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self._request.read_timeout
+
+    async def initialize(self) -> None:
+        await self._request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.scheduler.shutdown()
+        await self._request.shutdown()
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        **timeouts
+    ) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        if endpoint in UNSCHEDULED_METHODS:
+            return await self._send(endpoint, url, method, request_data, timeouts)
+        with tracer.span(f"bot_api.{endpoint}") as span:
+            return await self._paced(endpoint, url, method, request_data, timeouts, span)
+
+    async def _paced(self, endpoint, url, method, request_data, timeouts, span) -> Tuple[int, bytes]:
+        chat_id = request_data.parameters.get('chat_id') if request_data else None
+        level = outbound_priority.get()
+        if level is None:
+            level = METHOD_PRIORITIES.get(endpoint, NORMAL)
+        
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            await self.scheduler.acquire(level, chat_id)
+            if span is not None:
+                span.attrs['attempts'] = attempt + 1
+                span.attrs['paced_ms'] = round(
+                    span.attrs.get('paced_ms', 0) + (time.perf_counter() - start) * 1000, 3
+                )
+            code, payload = await self._send(endpoint, url, method, request_data, timeouts)
+            retry_after = _retry_after(code, payload)
+            if retry_after is None or attempt == self.max_retries:
+                return code, payload
+            self.scheduler.pause(chat_id, retry_after)
+        return code, payload
+
+    async def _send(self, endpoint, url, method, request_data, timeouts) -> Tuple[int, bytes]:
+        start = time.perf_counter()
+        try:
+            code, payload = await self._request.do_request(url, method, request_data, **timeouts)
+        except Exception as e:
+            telegram_api_errors.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            telegram_api_seconds.observe(time.perf_counter() - start, endpoint)
+        if code != 200:
+            telegram_api_errors.inc(endpoint, str(code))
+        return code, payload
+
+def _retry_after(code: int, payload: bytes) -> Optional[float]:
+    """Get retry_after from a 429 response, or None for anything else."""
+    if code != 429:
+        return None
+    try:
+        return float(json.loads(payload)['parameters']['retry_after'])
+    except (ValueError, KeyError, TypeError):
+        return 1.0
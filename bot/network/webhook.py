@@ -0,0 +1,178 @@
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+from http import HTTPStatus
+from typing import Optional
+
+from telegram import Update
+
+from .http import HTTPRequest, HTTPResponse, HTTPServer
+
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Public base URL registered with setWebhook
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1024'))
+WEBHOOK_INGEST_TIMEOUT = float(os.getenv('WEBHOOK_INGEST_TIMEOUT', '2'))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', '30'))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+class IngestQueue(asyncio.Queue):
+    """Update queue that counts an update against its capacity until its handlers finish.
+
+    The application moves updates off the queue into tasks right away, so a
+    plain maxsize would never fill; this one frees a slot on task_done().
+    """
+
+    def __init__(self, capacity: int = WEBHOOK_QUEUE_SIZE):
+        super().__init__()
+        self.capacity = capacity
+        self.in_flight = 0
+        self._space = asyncio.Event()
+        self._space.set()
+
+    def put_nowait(self, item) -> None:
+        if self.in_flight >= self.capacity:
+            raise asyncio.QueueFull
+        self.in_flight += 1
+        super().put_nowait(item)
+
+    async def put(self, item) -> None:
+        while self.in_flight >= self.capacity:
+            self._space.clear()
+            await self._space.wait()
+        self.put_nowait(item)
+
+    def task_done(self) -> None:
+        super().task_done()
+        self.in_flight -= 1
+        self._space.set()
+
+class WebhookReceiver:
+    """Accept Bot API webhook POSTs on an embedded HTTP server and feed the application."""
+
+    def __init__(
+        self,
+        application,
+        secret_token: str = WEBHOOK_SECRET,
+        path: str = WEBHOOK_PATH,
+        host: str = WEBHOOK_HOST,
+        port: int = WEBHOOK_PORT,
+        ingest_timeout: float = WEBHOOK_INGEST_TIMEOUT,
+        drain_timeout: float = WEBHOOK_DRAIN_TIMEOUT
+    ):
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path
+        self.ingest_timeout = ingest_timeout
+        self.drain_timeout = drain_timeout
+        self.server = HTTPServer(self._handle, host, port)
+        self.accepted = 0
+        self.rejected = 0
+        self.busy = 0
+        self._draining = False
+        self._requests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def _handle(self, request: HTTPRequest) -> HTTPResponse:
+        if request.path != self.path:
+            return HTTPResponse(HTTPStatus.NOT_FOUND)
+        if request.method != 'POST':
+            return HTTPResponse(HTTPStatus.METHOD_NOT_ALLOWED)
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret_token):
+            self.rejected += 1
+            return HTTPResponse(HTTPStatus.FORBIDDEN)
+        if self._draining:
+            return HTTPResponse(HTTPStatus.SERVICE_UNAVAILABLE)
+
+        try:
+            update = Update.de_json(json.loads(request.body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"Error decoding webhook update: {e}")
+            self.rejected += 1
+            return HTTPResponse(HTTPStatus.BAD_REQUEST)
+
+        self._requests += 1
+        self._idle.clear()
+        try:
+            queue = self.application.update_queue
+            try:
+                queue.put_nowait(update)
+            except asyncio.QueueFull:
+                # Hold the connection briefly; if handlers still can't keep up, Telegram retries later
+                try:
+                    await asyncio.wait_for(queue.put(update), self.ingest_timeout)
+                except asyncio.TimeoutError:
+                    self.busy += 1
+                    return HTTPResponse(HTTPStatus.SERVICE_UNAVAILABLE)
+            self.accepted += 1
+            return HTTPResponse(HTTPStatus.OK)
+        finally:
+            self._requests -= 1
+            if not self._requests:
+                self._idle.set()
+
+    async def start(self) -> None:
+        await self.server.start()
+        if WEBHOOK_URL:
+            await self.application.bot.set_webhook(
+                url=f"{WEBHOOK_URL}{self.path}",
+                secret_token=self.secret_token,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES
+            )
+
+    async def stop(self) -> None:
+        """Refuse new updates, then wait for accepted ones to be handled."""
+        # The webhook stays registered so Telegram holds updates while we're down
+        self._draining = True
+        await self._idle.wait()
+        await self.server.stop()
+        try:
+            await asyncio.wait_for(self.application.update_queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Webhook drain timed out with {self.application.update_queue.qsize()} updates queued")
+
+    def stats(self) -> dict:
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'busy': self.busy,
+            'in_flight': getattr(self.application.update_queue, 'in_flight', 0)
+        }
+
+async def serve_webhook(application, receiver: Optional[WebhookReceiver] = None) -> None:
+    """Run the application on webhook updates until SIGINT or SIGTERM."""
+    receiver = receiver or WebhookReceiver(application)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await receiver.start()
+        print(f"Receiving webhook updates on {receiver.server.host}:{receiver.server.port}{receiver.path}")
+        await stop.wait()
+        await receiver.stop()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+def run_webhook(application, receiver: Optional[WebhookReceiver] = None) -> None:
+    """Blocking entry point for webhook mode, the counterpart of run_polling()."""
+    asyncio.run(serve_webhook(application, receiver))
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import re
+import string
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from bot.utils.metrics import search_seconds
+from bot.utils.tracing import tracer
+
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '1024'))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '3600'))
+
+_PUNCTUATION = str.maketrans(string.punctuation, ' ' * len(string.punctuation))
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_query(query: str) -> str:
+    """Reduce a search query to a cache key that ignores case, spacing and punctuation.
+
+    "Artist - Title" and "Title - Artist" map to the same key.
+    """
+    parts = []
+    for part in re.split(r'\s+[-–—]\s+', query.strip()):
+        part = _WHITESPACE.sub(' ', part.casefold().translate(_PUNCTUATION)).strip()
+        if part:
+            parts.append(part)
+    return ' - '.join(sorted(parts))
+
+class SearchCache:
+    """LRU + TTL cache in front of a search function that shares in-flight lookups."""
+
+    def __init__(
+        self,
+        search_func: Callable[[str], Awaitable[List[dict]]],
+        max_size: int = SEARCH_CACHE_SIZE,
+        ttl: float = SEARCH_CACHE_TTL
+    ):
+        self.search_func = search_func
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, List[dict]]]' = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def search(self, query: str) -> List[dict]:
+        """Get results for a query from the cache, a lookup already running, or a new lookup."""
+        key = normalize_query(query)
+        
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, results = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return results
+            del self._entries[key]
+        
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._lookup(key, query))
+            self._in_flight[key] = task
+        # Shield the shared lookup so one cancelled caller doesn't cancel it for the rest
+        return await asyncio.shield(task)
+
+    async def _lookup(self, key: str, query: str) -> List[dict]:
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            with tracer.span('downloader.search_music'):
+                results = await self.search_func(query)
+            outcome = 'ok' if results else 'empty'
+            self._store(key, results)
+            return results
+        finally:
+            search_seconds.observe(time.perf_counter() - start, outcome)
+            self._in_flight.pop(key, None)
+
+    def _store(self, key: str, results: List[dict]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached results."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Get hit, miss and coalesce counters."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'size': len(self._entries),
+            'in_flight': len(self._in_flight)
+        }
+
+    def samples(self) -> Iterable[tuple]:
+        """Metrics collector for the cache counters."""
+        for outcome in ('hits', 'misses', 'coalesced'):
+            yield (
+                'bot_search_cache_requests_total', 'counter', "Search cache lookups by outcome.",
+                {'outcome': outcome}, getattr(self, outcome)
+            )
+        yield ('bot_search_cache_entries', 'gauge', "Queries held in the search cache.", {}, len(self._entries))
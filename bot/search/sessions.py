@@ -0,0 +1,56 @@
+import asyncio
+import os
+import time
+from typing import Coroutine, Dict, Optional
+
+from bot.utils.metrics import search_session_seconds
+from bot.utils.tracing import tracer
+
+SEARCH_DEBOUNCE_SECONDS = float(os.getenv('SEARCH_DEBOUNCE_SECONDS', '0.4'))
+
+class SearchSessions:
+    """Run at most one search per user, debounced, cancelling the one it supersedes."""
+
+    def __init__(self, debounce: float = SEARCH_DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def submit(self, user_id: int, search: Coroutine) -> asyncio.Task:
+        """Schedule a user's search in the background, replacing any search still pending."""
+        self.cancel(user_id)
+        task = asyncio.get_running_loop().create_task(self._run(user_id, search, time.perf_counter()))
+        # Close the search if it was cancelled before it ever started
+        task.add_done_callback(lambda _: search.close())
+        self._tasks[user_id] = task
+        return task
+
+    def cancel(self, user_id: int) -> bool:
+        """Cancel the user's pending search, if any."""
+        task = self._tasks.pop(user_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            return True
+        return False
+
+    def current(self, user_id: int) -> Optional[asyncio.Task]:
+        """Get the user's pending search task."""
+        return self._tasks.get(user_id)
+
+    async def _run(self, user_id: int, search: Coroutine, submitted: float) -> None:
+        # The handler returns as soon as the search is submitted, so its latency is only measured here
+        outcome = 'error'
+        try:
+            # Wait out the debounce window; a newer query cancels us while we sleep
+            await asyncio.sleep(self.debounce)
+            with tracer.trace('search', user_id=user_id):
+                await search
+            outcome = 'done'
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+        finally:
+            search_session_seconds.observe(time.perf_counter() - submitted, outcome)
+            if self._tasks.get(user_id) is asyncio.current_task():
+                del self._tasks[user_id]
+
+search_sessions = SearchSessions()
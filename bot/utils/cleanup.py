@@ -0,0 +1,59 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Iterable, List, Set
+
+CLEANUP_CONCURRENCY = int(os.getenv('CLEANUP_CONCURRENCY', '8'))
+# Bot API limit for a single deleteMessages call
+DELETE_BATCH_SIZE = 100
+
+class MessageCleaner:
+    """Delete stale messages in the background, batched per chat and capped in concurrency."""
+
+    def __init__(self, concurrency: int = CLEANUP_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, bot, messages: Iterable) -> None:
+        """Queue messages (anything with chat_id and message_id) for deletion without waiting."""
+        by_chat = defaultdict(list)
+        for message in messages:
+            if message is not None:
+                by_chat[message.chat_id].append(message.message_id)
+        
+        for chat_id, message_ids in by_chat.items():
+            task = asyncio.get_running_loop().create_task(self._delete(bot, chat_id, message_ids))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _delete(self, bot, chat_id: int, message_ids: List[int]) -> None:
+        if hasattr(bot, 'delete_messages'):
+            for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                batch = message_ids[start:start + DELETE_BATCH_SIZE]
+                async with self._semaphore:
+                    try:
+                        await bot.delete_messages(chat_id, batch)
+                    except Exception as e:
+                        _report(e)
+        else:
+            await asyncio.gather(*(
+                self._delete_one(bot, chat_id, message_id) for message_id in message_ids
+            ))
+
+    async def _delete_one(self, bot, chat_id: int, message_id: int) -> None:
+        async with self._semaphore:
+            try:
+                await bot.delete_message(chat_id, message_id)
+            except Exception as e:
+                _report(e)
+
+    async def drain(self) -> None:
+        """Wait for all scheduled deletions to finish."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+def _report(error: Exception) -> None:
+    if "Message to delete not found" not in str(error):
+        print(f"Error deleting messages: {error}")
+
+message_cleaner = MessageCleaner()
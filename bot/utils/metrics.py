@@ -0,0 +1,229 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from http import HTTPStatus
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bot.network.http import HTTPRequest, HTTPResponse, HTTPServer
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('METRICS_PORT', '9464')  # Empty to disable the endpoint
+METRICS_PATH = '/metrics'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers cached renders through slow remote searches
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+class Histogram:
+    """Bucketed distribution of observed values with optional labels."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # Bucket counts, then +Inf, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def time(self, *labels: str) -> '_Timer':
+        """Context manager that observes the time spent inside it."""
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                bucket = _labels(self.label_names, labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(values[-1])}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class Registry:
+    """Metrics plus collectors that read other components' counters at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable) -> None:
+        """Register a callable yielding (name, kind, help, labels, value) tuples."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render everything in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        described = set()
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+            for name, kind, help, labels, value in samples:
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+handler_seconds = registry.histogram(
+    'bot_handler_seconds', "Time spent in an update handler.", ('handler',)
+)
+handler_errors = registry.counter(
+    'bot_handler_errors_total', "Exceptions raised out of an update handler.", ('handler',)
+)
+db_query_seconds = registry.histogram(
+    'bot_db_query_seconds', "Time a DatabaseManager method spent on its worker thread.", ('method',)
+)
+db_query_errors = registry.counter(
+    'bot_db_query_errors_total', "DatabaseManager methods that failed, raising or returning a fallback.", ('method',)
+)
+search_seconds = registry.histogram(
+    'bot_search_seconds', "Latency of remote music searches on a cache miss.", ('outcome',)
+)
+search_session_seconds = registry.histogram(
+    'bot_search_session_seconds', "Time from a search query to its results, debounce included.", ('outcome',)
+)
+telegram_api_seconds = registry.histogram(
+    'bot_telegram_api_seconds', "Latency of one Bot API HTTP request, excluding pacing.", ('method',)
+)
+telegram_api_errors = registry.counter(
+    'bot_telegram_api_errors_total', "Bot API requests that failed or returned non-200.", ('method', 'code')
+)
+
+def callback_route(data: Optional[str]) -> str:
+    """Callback data without its id arguments, e.g. 'p_del_12_1_0' -> 'p_del_'."""
+    if not data:
+        return ''
+    parts = data.split('_')
+    for i, part in enumerate(parts):
+        if part.lstrip('-').isdigit():
+            return '_'.join(parts[:i]) + '_'
+    return data
+
+def instrument_handler(name: str, route: Optional[Callable] = None):
+    """Record latency and escaped errors of a handler, optionally split by a route of the update."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update, context):
+            label = f"{name}:{route(update)}" if route is not None else name
+            start = time.perf_counter()
+            try:
+                return await func(update, context)
+            except Exception:
+                handler_errors.inc(label)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - start, label)
+        return wrapper
+    return decorator
+
+class MetricsEndpoint:
+    """Serve the registry on a local HTTP endpoint."""
+
+    def __init__(self, registry: Registry = registry, host: str = METRICS_HOST, port: int = int(METRICS_PORT or 0)):
+        self.registry = registry
+        self.server = HTTPServer(self._handle, host, port)
+
+    async def _handle(self, request: HTTPRequest) -> HTTPResponse:
+        if request.path.split('?', 1)[0] != METRICS_PATH:
+            return HTTPResponse(HTTPStatus.NOT_FOUND)
+        if request.method != 'GET':
+            return HTTPResponse(HTTPStatus.METHOD_NOT_ALLOWED)
+        return HTTPResponse(HTTPStatus.OK, self.registry.render().encode(), CONTENT_TYPE)
+
+    async def start(self) -> None:
+        await self.server.start()
+
+    async def stop(self) -> None:
+        await self.server.stop()
+
+metrics_endpoint = MetricsEndpoint()
@@ -0,0 +1,204 @@
+import asyncio
+import os
+import sys
+import time
+from typing import NamedTuple, Optional, Tuple
+
+SESSION_TTL = float(os.getenv('SESSION_TTL', str(24 * 3600)))
+SESSION_MEMORY_BUDGET = int(os.getenv('SESSION_MEMORY_BUDGET', str(64 * 1024 * 1024)))
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
+
+class MessageRef(NamedTuple):
+    """Just enough of a sent message to edit or delete it later."""
+    chat_id: int
+    message_id: int
+
+    @classmethod
+    def of(cls, message) -> Optional['MessageRef']:
+        return cls(message.chat_id, message.message_id) if message is not None else None
+
+    async def edit_text(self, bot, text: str, **kwargs):
+        return await bot.edit_message_text(
+            text, chat_id=self.chat_id, message_id=self.message_id, **kwargs
+        )
+
+class SearchResult:
+    """Compact copy of the search result fields the bot uses after showing results."""
+    __slots__ = ('id', 'title', 'uploader', 'duration', 'url')
+
+    def __init__(self, id=None, title='', uploader=None, duration=0, url=None):
+        self.id = id
+        self.title = title
+        self.uploader = uploader
+        self.duration = duration
+        self.url = url
+
+    @classmethod
+    def from_track(cls, track: dict) -> 'SearchResult':
+        return cls(
+            track.get('id'),
+            track.get('title', ''),
+            track.get('uploader'),
+            track.get('duration') or 0,
+            track.get('webpage_url') or track.get('url')
+        )
+
+    def to_row(self) -> tuple:
+        return (self.id, self.title, self.uploader, self.duration, self.url)
+
+    def to_track(self) -> dict:
+        """Rebuild the search result dict expected by the downloader and the database."""
+        track = {'title': self.title, 'uploader': self.uploader, 'duration': self.duration}
+        if self.id is not None:
+            track['id'] = self.id
+        if self.url is not None:
+            track['url'] = self.url
+        return track
+
+class UserSession:
+    """Per-user conversation state, used as the bot's user_data.
+
+    Holds message references and compact search results only, never full
+    telegram.Message objects, so an idle session costs a few hundred bytes.
+    """
+    __slots__ = (
+        'last_bot_message',
+        'last_bot_messages',
+        'last_audio_message',
+        'last_user_message',
+        'search_query',
+        'search_results',
+        'expecting_search',
+        'touched'
+    )
+
+    def __init__(self):
+        self.last_bot_message: Optional[MessageRef] = None
+        self.last_bot_messages: Tuple[MessageRef, ...] = ()
+        self.last_audio_message: Optional[MessageRef] = None
+        self.last_user_message: Optional[MessageRef] = None
+        self.search_query: Optional[str] = None
+        self.search_results: Tuple[SearchResult, ...] = ()
+        self.expecting_search = False
+        self.touched = time.monotonic()
+
+    def to_state(self) -> dict:
+        """Plain, JSON-ready copy of the durable fields."""
+        return {
+            'last_bot_message': self.last_bot_message,
+            'last_bot_messages': self.last_bot_messages,
+            'last_audio_message': self.last_audio_message,
+            'last_user_message': self.last_user_message,
+            'search_query': self.search_query,
+            'search_results': [result.to_row() for result in self.search_results],
+            'expecting_search': self.expecting_search
+        }
+
+    def load_state(self, state: dict) -> None:
+        """Fill this session in place from a to_state() dict."""
+        ref = lambda value: MessageRef(*value) if value else None
+        self.last_bot_message = ref(state.get('last_bot_message'))
+        self.last_bot_messages = tuple(MessageRef(*value) for value in state.get('last_bot_messages', ()))
+        self.last_audio_message = ref(state.get('last_audio_message'))
+        self.last_user_message = ref(state.get('last_user_message'))
+        self.search_query = state.get('search_query')
+        self.search_results = tuple(SearchResult(*row) for row in state.get('search_results', ()))
+        self.expecting_search = state.get('expecting_search', False)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this session."""
+        size = sys.getsizeof(self)
+        for ref in (self.last_bot_message, self.last_audio_message, self.last_user_message):
+            if ref is not None:
+                size += sys.getsizeof(ref)
+        size += sys.getsizeof(self.last_bot_messages) + sum(sys.getsizeof(ref) for ref in self.last_bot_messages)
+        if self.search_query is not None:
+            size += sys.getsizeof(self.search_query)
+        size += sys.getsizeof(self.search_results)
+        for result in self.search_results:
+            size += sys.getsizeof(result) + sys.getsizeof(result.title)
+            if result.uploader:
+                size += sys.getsizeof(result.uploader)
+            if result.url:
+                size += sys.getsizeof(result.url)
+        return size
+
+class SessionStore:
+    """Evict user sessions from the application by TTL, then LRU to fit a memory budget."""
+
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        memory_budget: int = SESSION_MEMORY_BUDGET,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL
+    ):
+        self.ttl = ttl
+        self.memory_budget = memory_budget
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        self._task: Optional[asyncio.Task] = None
+        self._last_stats = {'active_users': 0, 'total_bytes': 0, 'bytes_per_user': 0}
+
+    async def touch(self, update, context) -> None:
+        """Mark the sender's session as used; run for every update before the handlers."""
+        if update.effective_user is not None:
+            context.user_data.touched = time.monotonic()
+
+    def _drop(self, application, user_id: int) -> None:
+        # A persistence backend that can evict keeps the durable copy of the session
+        evict = getattr(application.persistence, 'evict', None)
+        if evict is not None:
+            evict(user_id, application.user_data[user_id])
+        application.drop_user_data(user_id)
+
+    def sweep(self, application) -> int:
+        """Drop expired sessions, then least recently used ones while over budget."""
+        now = time.monotonic()
+        sessions = application.user_data
+        expired = [user_id for user_id, session in sessions.items() if now - session.touched > self.ttl]
+        for user_id in expired:
+            self._drop(application, user_id)
+        
+        sizes = {user_id: session.nbytes() for user_id, session in sessions.items()}
+        total = sum(sizes.values())
+        dropped = len(expired)
+        if total > self.memory_budget:
+            for user_id in sorted(sizes, key=lambda uid: sessions[uid].touched):
+                if total <= self.memory_budget:
+                    break
+                total -= sizes[user_id]
+                self._drop(application, user_id)
+                dropped += 1
+        
+        active = len(sessions)
+        self._last_stats = {
+            'active_users': active,
+            'total_bytes': total,
+            'bytes_per_user': total // active if active else 0
+        }
+        self.evicted += dropped
+        return dropped
+
+    def stats(self) -> dict:
+        """Get session counts and memory use as of the last sweep."""
+        return dict(self._last_stats, evicted=self.evicted)
+
+    async def _run(self, application) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep(application)
+
+    def start(self, application) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(application))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+session_store = SessionStore()
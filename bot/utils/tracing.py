@@ -0,0 +1,256 @@
+import argparse
+import contextvars
+import glob
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from .metrics import callback_route
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '1000'))  # Traces at least this slow are always kept
+# Outside the working directory, which is often a checkout
+TRACE_PATH = os.getenv('TRACE_PATH', os.path.join(tempfile.gettempdir(), 'lightbolt-traces.jsonl'))
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', str(16 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv('TRACE_BACKUPS', '3'))
+TRACE_MAX_SPANS = 256  # Per trace; further spans are counted but not kept
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_trace_ids = itertools.count(1)
+
+class Trace:
+    __slots__ = ('trace_id', 'sampled', 'wall_start', 'spans', 'dropped', 'finished', '_span_ids')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{os.getpid():x}-{next(_trace_ids):x}"
+        self.sampled = sampled
+        self.wall_start = time.time()
+        self.spans: List['Span'] = []
+        self.dropped = 0
+        self.finished = False
+        self._span_ids = itertools.count()
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'end', 'attrs', 'error')
+
+    def __init__(self, trace: Trace, parent_id: Optional[int], name: str, attrs: dict):
+        self.trace = trace
+        self.span_id = next(trace._span_ids)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.error = None
+        self.start = time.perf_counter()
+        self.end = None
+
+    def to_dict(self, origin: float) -> dict:
+        span = {
+            'id': self.span_id,
+            'parent': self.parent_id,
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(((self.end or self.start) - self.start) * 1000, 3)
+        }
+        if self.attrs:
+            span['attrs'] = self.attrs
+        if self.error:
+            span['error'] = self.error
+        return span
+
+class Tracer:
+    """Per-update traces with head-based sampling, keeping every trace slower than slow_ms.
+
+    Spans are collected for every trace so a slow one can be kept in full;
+    kept traces go to a rotating JSONL file from a background thread.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        slow_ms: float = TRACE_SLOW_MS,
+        path: str = TRACE_PATH,
+        max_bytes: int = TRACE_MAX_BYTES,
+        backups: int = TRACE_BACKUPS
+    ):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = sample_rate > 0 or slow_ms > 0
+        self.kept = 0
+        self.discarded = 0
+        self._logger: Optional[logging.Logger] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+
+    @contextmanager
+    def trace(self, name: str, **attrs) -> Iterator[Optional[Span]]:
+        """Open a root span; other work traced inside it becomes its children."""
+        if not self.enabled:
+            yield None
+            return
+        outer = _current_span.get()
+        if outer is not None:
+            attrs['link'] = outer.trace.trace_id  # Started from work in another trace
+        trace = Trace(random.random() < self.sample_rate)
+        root = Span(trace, None, name, attrs)
+        trace.spans.append(root)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            root.end = time.perf_counter()
+            trace.finished = True
+            _current_span.reset(token)
+            self._finish(trace, root)
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Optional[Span]]:
+        """Record a child span of the current trace; does nothing outside a trace."""
+        parent = _current_span.get()
+        if parent is None or parent.trace.finished:
+            yield None
+            return
+        trace = parent.trace
+        span = Span(trace, parent.span_id, name, attrs)
+        if len(trace.spans) < TRACE_MAX_SPANS:
+            trace.spans.append(span)
+        else:
+            trace.dropped += 1
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def _finish(self, trace: Trace, root: Span) -> None:
+        duration_ms = (root.end - root.start) * 1000
+        slow = duration_ms >= self.slow_ms
+        if not (trace.sampled or slow):
+            self.discarded += 1
+            return
+        record = {
+            'trace_id': trace.trace_id,
+            'name': root.name,
+            'time': trace.wall_start,
+            'duration_ms': round(duration_ms, 3),
+            'sampled': trace.sampled,
+            'slow': slow,
+            'attrs': root.attrs,
+            'spans': [span.to_dict(root.start) for span in trace.spans[1:]]
+        }
+        if root.error:
+            record['error'] = root.error
+        if trace.dropped:
+            record['dropped_spans'] = trace.dropped
+        try:
+            self._writer().info(json.dumps(record, default=str, separators=(',', ':')))
+            self.kept += 1
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing trace: {e}")
+
+    def _writer(self) -> logging.Logger:
+        if self._logger is None:
+            records = queue.SimpleQueue()
+            file_handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8'
+            )
+            file_handler.setFormatter(logging.Formatter('%(message)s'))
+            self._listener = logging.handlers.QueueListener(records, file_handler)
+            self._listener.start()
+            logger = logging.getLogger(f'{__name__}.{id(self)}')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(logging.handlers.QueueHandler(records))
+            self._logger = logger
+        return self._logger
+
+    def close(self) -> None:
+        """Flush pending traces to disk and stop the writer thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+            self._logger.handlers.clear()
+            self._logger = None
+
+def describe_update(update) -> Dict[str, object]:
+    """Root span attributes for an update: id, sender and what kind of update it is."""
+    attrs = {'update_id': getattr(update, 'update_id', None)}
+    user = getattr(update, 'effective_user', None)
+    if user is not None:
+        attrs['user_id'] = user.id
+    if getattr(update, 'callback_query', None) is not None:
+        attrs['kind'] = f"callback:{callback_route(update.callback_query.data)}"
+    elif getattr(update, 'message', None) is not None and update.message.text:
+        text = update.message.text
+        attrs['kind'] = text.split()[0].split('@')[0] if text.startswith('/') else 'text'
+    return attrs
+
+tracer = Tracer()
+
+def read_traces(path: str = TRACE_PATH) -> Iterator[dict]:
+    """Read traces from the current file and its rotated backups."""
+    for name in sorted(glob.glob(f"{glob.escape(path)}*")):
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def format_trace(trace: dict) -> str:
+    """Render a trace as an indented span tree plus time per span name."""
+    attrs = ' '.join(f"{key}={value}" for key, value in trace.get('attrs', {}).items())
+    lines = [f"{trace['duration_ms']:10.1f}ms  {trace['name']}  {attrs}  [{trace['trace_id']}]"]
+    children: Dict[Optional[int], List[dict]] = {}
+    for span in trace['spans']:
+        children.setdefault(span['parent'], []).append(span)
+
+    def walk(parent_id, depth):
+        for span in sorted(children.get(parent_id, []), key=lambda s: s['start_ms']):
+            error = f"  !{span['error']}" if span.get('error') else ''
+            lines.append(f"{span['duration_ms']:10.1f}ms  {'  ' * depth}{span['name']}  @{span['start_ms']:.1f}ms{error}")
+            walk(span['id'], depth + 1)
+    walk(0, 1)
+
+    totals: Dict[str, float] = {}
+    for span in trace['spans']:
+        group = span['name'].split('.', 1)[0]
+        totals[group] = totals.get(group, 0) + span['duration_ms']
+    if totals:
+        lines.append("            " + "  ".join(f"{name}={ms:.1f}ms" for name, ms in sorted(totals.items(), key=lambda item: -item[1])))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print the slowest recorded traces with their span breakdown.")
+    parser.add_argument('--path', default=TRACE_PATH)
+    parser.add_argument('-n', '--limit', type=int, default=10)
+    parser.add_argument('--kind', help="Only traces whose name or kind attribute starts with this")
+    args = parser.parse_args()
+
+    traces = read_traces(args.path)
+    if args.kind:
+        traces = (
+            t for t in traces
+            if t['name'].startswith(args.kind) or str(t.get('attrs', {}).get('kind', '')).startswith(args.kind)
+        )
+    for trace in sorted(traces, key=lambda t: t['duration_ms'], reverse=True)[:args.limit]:
+        print(format_trace(trace))
+        print()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .tracing import describe_update, tracer
+
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '16'))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '1024'))
+
+class _UserLane:
+    __slots__ = ('lock', 'waiting')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process one user's updates in order, and different users' updates in parallel.
+
+    Updates wait for the sender's previous update before taking one of the
+    `concurrency` handler slots, so a user with a backlog never holds slots
+    other users could use. At most `max_pending` updates are in flight at once.
+    """
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, max_pending: int = UPDATE_MAX_PENDING):
+        super().__init__(max_concurrent_updates=max(max_pending, concurrency, 2))
+        self.concurrency = concurrency
+        self.processed = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._lanes: Dict[Hashable, _UserLane] = {}
+
+    @staticmethod
+    def lane_key(update: object) -> Optional[Hashable]:
+        """Key that orders an update: its sender, else its chat, else none."""
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return update.effective_user.id
+            if update.effective_chat is not None:
+                return ('chat', update.effective_chat.id)
+        return None
+
+    @property
+    def active_lanes(self) -> int:
+        """Number of users with an update running or waiting."""
+        return len(self._lanes)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.lane_key(update)
+        if key is None:
+            async with self._slots:
+                with tracer.trace('update', **describe_update(update)):
+                    await coroutine
+            self.processed += 1
+            return
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _UserLane()
+        lane.waiting += 1
+        try:
+            async with lane.lock:
+                async with self._slots:
+                    with tracer.trace('update', **describe_update(update)):
+                        await coroutine
+            self.processed += 1
+        except asyncio.CancelledError:
+            coroutine.close()  # Cancelled while queued behind the user's earlier updates
+            raise
+        finally:
+            lane.waiting -= 1
+            if not lane.waiting:
+                del self._lanes[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass